@@ -6,6 +6,10 @@ class AbstractPlayer:
     """Your player must inherit from this class, and your player class name must be 'Player', as in the given examples.
 Like this: 'class Player(abstract.AbstractPlayer):'
     """
+    # Whether the game runner must time the moves of the player. A player that moves at once (e.g. at random) sets
+    # it to False, and the headless runner then calls it directly, without a thread to time it in.
+    needs_timing = True
+
     def __init__(self, setup_time, player_color, time_per_k_turns, k):
         """Player initialization.
 
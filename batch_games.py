@@ -0,0 +1,44 @@
+"""
+Plays many random games at once with the batch simulator of checkers/batch.py (which needs NumPy), and
+reports the results and the throughput: games and moves per second.
+The games start from the initial position, or from a position of perft.py.
+"""
+import sys
+import time
+import numpy as np
+from checkers.batch import GameBatch, BATCH_RESULTS
+from perft import PERFT_POSITIONS, perft_position
+
+
+def play_batch(games, seed, position_name=None):
+    """Plays random games in a single batch.
+    :param position_name: The name of a position of PERFT_POSITIONS to start from, or None for the initial one.
+    :return: A tuple: (The GameBatch, The elapsed time in seconds)
+    """
+    if position_name is None:
+        batch = GameBatch(games)
+    else:
+        batch = GameBatch.from_states([perft_position(position_name) for _ in range(games)])
+    start = time.perf_counter()
+    batch.play(np.random.default_rng(seed))
+    return batch, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    try:
+        games, seed = int(sys.argv[1]), int(sys.argv[2])
+        start_position = sys.argv[3] if len(sys.argv) > 3 else None
+        if start_position is not None and start_position not in PERFT_POSITIONS:
+            raise ValueError(start_position)
+    except (IndexError, ValueError):
+        print("""Syntax: {0} games seed [position]
+Positions: {1}
+For example: {0} 10000 0""".format(sys.argv[0], ', '.join(PERFT_POSITIONS)))
+        sys.exit(2)
+
+    batch, elapsed = play_batch(games, seed, start_position)
+    results = np.bincount(batch.result, minlength=len(BATCH_RESULTS))
+    print(', '.join('{}: {}'.format(BATCH_RESULTS[result], count) for result, count in enumerate(results)))
+    total_moves = int(batch.moves.sum())
+    print('{} games, {} moves in {:.2f}s: {:.0f} games/s, {:.0f} moves/s'.format(
+        games, total_moves, elapsed, games / elapsed, total_moves / elapsed))
@@ -0,0 +1,223 @@
+"""
+A reproducible benchmark of the players' searches.
+Every player searches every position of a fixed set of midgame and endgame positions twice: to a fixed
+depth, and to a fixed number of nodes. Each run is an iterative deepening search with a new
+player, in this process and limited by depth or nodes instead of time (see utils.SearchLimit). It
+records the time to reach every depth, the nodes, the nodes per second and the peak memory the search
+allocated.
+The results are written as JSON, and can be compared with the results of an earlier run (a baseline):
+players that got slower over all the positions, or runs that use more memory, beyond a threshold are
+reported as regressions.
+Searches to a fixed depth must also search the same number of nodes, or the search itself has changed.
+The players search without the tablebases and the opening book, so the results do not depend on which of those
+files happen to exist.
+"""
+import sys
+import json
+import copy
+import time
+import tracemalloc
+from checkers.board import GameState
+from checkers.consts import RED_PLAYER, BLACK_PLAYER
+from perft import PERFT_POSITIONS
+from utils import INFINITY
+
+# A position: (red mask, black mask, king mask, player to move, turns since last jump). See bitboard.py.
+# The endgames have more tools than the tablebases, which would answer them without a search.
+BENCHMARK_POSITIONS = {
+    # Twelve plies into the game, with all the tools on the board.
+    'early': (0x119ef, 0x7b744000, 0, RED_PLAYER, 3),
+    'mid': PERFT_POSITIONS['mid'],
+    # An open midgame without kings.
+    'open': (0x80108f, 0xf8400400, 0, BLACK_PLAYER, 0.5),
+    # Three pawns against four.
+    'pawns': (0xa88, 0x50120000, 0, BLACK_PLAYER, 0),
+    'kings': PERFT_POSITIONS['kings'],
+    'end': PERFT_POSITIONS['end'],
+}
+
+BENCHMARK_PLAYERS = ('simple_player', 'improved_player', 'better_h_player')
+BENCHMARK_DEPTH = 8
+BENCHMARK_NODES = 50000
+
+# How much slower (or bigger) than the baseline a run may be before it is reported, as a fraction.
+DEFAULT_REGRESSION_THRESHOLD = 0.1
+# Peak memory varies by some garbage collector timing, so it must also grow by this many bytes.
+MEMORY_REGRESSION_SLACK = 128 * 1024
+
+#===============================================================================
+# Running
+#===============================================================================
+
+def create_player(player_name, color):
+    """:return: A new player of the module players.player_name, playing color, without the tablebases and the
+             opening book (see simple_player.Player.use_tablebase).
+    """
+    module_name = 'players.{}'.format(player_name)
+    __import__(module_name)
+    player_class = type('BenchmarkPlayer', (sys.modules[module_name].Player,),
+                        {'use_tablebase': False, 'use_opening_book': False})
+    return player_class(INFINITY, color, INFINITY, 1)
+
+
+def benchmark_search(player, state, max_depth=None, max_nodes=None):
+    """Runs an iterative deepening search of a new player, without a time limit, until max_depth is
+    completed or max_nodes are searched (see SearchLimit). The player is not used again.
+    :return: A SearchResult.
+    """
+    try:
+        return player.search_worker.iterative_deepening(copy.copy(state), None, max_depth, max_nodes)
+    finally:
+        player.close()
+
+
+def peak_memory(player_name, state, max_depth):
+    """Searches again, tracing the memory allocations, which slows the search down.
+    :return: The peak of the memory allocated during the search, in bytes.
+    """
+    player = create_player(player_name, state.curr_player)
+    tracemalloc.start()
+    try:
+        start_memory, _ = tracemalloc.get_traced_memory()
+        benchmark_search(player, state, max_depth)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - start_memory
+
+
+def run_record(player_name, position_name, mode, result):
+    """:return: The record of a run, a dict of plain values that can be written as JSON."""
+    record = result.stats_record()
+    time_to_depth = []
+    elapsed = 0.0
+    for stats in result.iterations:
+        elapsed += stats.time
+        if stats.completed:
+            time_to_depth.append(elapsed)
+    return {
+        'player': player_name,
+        'position': position_name,
+        'mode': mode,
+        'depth': record['depth'],
+        'nodes': record['nodes'],
+        'time': record['time'],
+        'nps': record['nps'],
+        'time_to_depth': time_to_depth,
+        'move': str(result.best_move()),
+    }
+
+
+def run_benchmark(players=BENCHMARK_PLAYERS, positions=None, depth=BENCHMARK_DEPTH, nodes=BENCHMARK_NODES,
+                  progress=None):
+    """Runs every player on every position, to the fixed depth and to the fixed number of nodes.
+    :param positions: Names of BENCHMARK_POSITIONS, or None for all of them.
+    :param progress: An optional function called with every record.
+    :return: A list of records, see run_record. The fixed depth ones have the peak memory as well.
+    """
+    records = []
+    for player_name in players:
+        for position_name in positions or BENCHMARK_POSITIONS:
+            state = GameState.from_masks(*BENCHMARK_POSITIONS[position_name])
+            runs = (('depth', depth, None), ('nodes', None, nodes))
+            for mode, max_depth, max_nodes in runs:
+                player = create_player(player_name, state.curr_player)
+                result = benchmark_search(player, state, max_depth, max_nodes)
+                record = run_record(player_name, position_name, mode, result)
+                if mode == 'depth':
+                    record['peak_memory'] = peak_memory(player_name, state, max_depth)
+                records.append(record)
+                if progress is not None:
+                    progress(record)
+    return records
+
+#===============================================================================
+# Comparing
+#===============================================================================
+
+def player_totals(records):
+    """Sums the runs of every player and mode up, over the positions: per run times are too short to
+    compare on their own.
+    :return: A dict from (player, mode) to (nodes, time).
+    """
+    totals = {}
+    for record in records:
+        nodes, seconds = totals.get((record['player'], record['mode']), (0, 0.0))
+        totals[(record['player'], record['mode'])] = (nodes + record['nodes'], seconds + record['time'])
+    return totals
+
+
+def compare_records(records, baseline, threshold=DEFAULT_REGRESSION_THRESHOLD):
+    """Compares the records of a run with the ones of a baseline run.
+    :param threshold: How much worse than the baseline a figure may be, as a fraction.
+    :return: A list of (run name, message) for every regression: a player whose nodes per second (over all
+             the positions) dropped, or whose total time to the fixed depth grew, beyond the threshold; a run
+             whose peak memory grew beyond it; or a fixed depth run that searched a different number of
+             nodes. Runs missing from the baseline are skipped.
+    """
+    baseline_records = {(record['player'], record['position'], record['mode']): record for record in baseline}
+    regressions = []
+    for record in records:
+        old = baseline_records.get((record['player'], record['position'], record['mode']))
+        if old is None:
+            continue
+        name = '{} {} {}'.format(record['player'], record['position'], record['mode'])
+        if record['mode'] == 'depth' and record['nodes'] != old['nodes']:
+            regressions.append((name, 'searched {} nodes instead of {}'.format(record['nodes'], old['nodes'])))
+        if 'peak_memory' in old and record['peak_memory'] > max(old['peak_memory'] * (1 + threshold),
+                                                                old['peak_memory'] + MEMORY_REGRESSION_SLACK):
+            regressions.append((name, 'peak memory {} bytes instead of {}'.format(
+                record['peak_memory'], old['peak_memory'])))
+
+    # The totals of the baseline are over the positions of this run only.
+    run_keys = {(record['player'], record['position'], record['mode']) for record in records}
+    baseline_totals = player_totals(record for key, record in baseline_records.items() if key in run_keys)
+    for (player_name, mode), (nodes, seconds) in player_totals(records).items():
+        if (player_name, mode) not in baseline_totals:
+            continue
+        old_nodes, old_seconds = baseline_totals[(player_name, mode)]
+        name = '{} {}'.format(player_name, mode)
+        nps, old_nps = nodes / seconds, old_nodes / old_seconds
+        if nps < old_nps / (1 + threshold):
+            regressions.append((name, '{:.0f} nodes/s instead of {:.0f}'.format(nps, old_nps)))
+        if mode == 'depth' and seconds > old_seconds * (1 + threshold):
+            regressions.append((name, 'reached the depth in {:.3f}s instead of {:.3f}s'.format(seconds, old_seconds)))
+    return regressions
+
+
+def format_record(record):
+    text = '{player} {position} {mode}: depth {depth}, {nodes} nodes in {time:.3f}s, {nps:.0f} nodes/s'.format(
+        **record)
+    if 'peak_memory' in record:
+        text += ', peak memory {:.1f}KB'.format(record['peak_memory'] / 1024)
+    return text
+
+
+if __name__ == '__main__':
+    try:
+        output_file = sys.argv[1]
+        baseline_file = sys.argv[2] if len(sys.argv) > 2 and sys.argv[2] != '-' else None
+        threshold = float(sys.argv[3]) if len(sys.argv) > 3 else DEFAULT_REGRESSION_THRESHOLD
+        players = sys.argv[4].split(',') if len(sys.argv) > 4 else BENCHMARK_PLAYERS
+    except (IndexError, ValueError):
+        print("""Syntax: {0} output_file [baseline_file|-] [threshold] [players]
+For example: {0} bench.json baseline.json 0.1 simple_player,better_h_player
+Positions: {1}. Depth {2}, {3} nodes.""".format(sys.argv[0], ', '.join(BENCHMARK_POSITIONS), BENCHMARK_DEPTH,
+                                             BENCHMARK_NODES))
+        sys.exit(2)
+
+    start = time.time()
+    records = run_benchmark(players, progress=lambda record: print(format_record(record)))
+    with open(output_file, 'w') as f:
+        json.dump({'depth': BENCHMARK_DEPTH, 'nodes': BENCHMARK_NODES, 'records': records}, f, indent=1)
+    print('{} runs in {:.1f}s written to {}'.format(len(records), time.time() - start, output_file))
+
+    if baseline_file is not None:
+        with open(baseline_file) as f:
+            baseline_records = json.load(f)['records']
+        regressions = compare_records(records, baseline_records, threshold)
+        for name, message in regressions:
+            print('Regression: {}: {}'.format(name, message))
+        if regressions:
+            sys.exit(1)
+        print('No regressions against {}'.format(baseline_file))
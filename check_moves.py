@@ -0,0 +1,188 @@
+"""
+Correctness checks for the move generator.
+Plays random games and compares, side by side, the capture sequences of every position generated by
+GameState.iter_capture_sequences with the ones of the reference GameState.find_all_capture_sequence,
+and the lazy GameState.iter_moves and GameState.is_legal_move with GameState.get_possible_moves.
+With batch, plays random games with the batch simulator of checkers/batch.py (which needs NumPy) instead,
+checking it against GameState.
+reference_moves, the moves of a position by the reference implementation, is also used by perft.py.
+"""
+import sys
+import random
+from checkers.board import GameState
+from checkers.bitboard import LOC_SQUARES, SQUARE_LOCS, iter_squares
+from checkers.consts import MAX_TURNS_NO_JUMP, MY_COLORS, RP, RK, BP, BK, EM, RED_PLAYER, BLACK_PLAYER, TIE
+from checkers.moves import (GameMove, TOOL_CAPTURE_MOVES, UP_SINGLE_MOVES, DOWN_SINGLE_MOVES,
+                            KING_SINGLE_MOVES)
+
+# The single moves of every tool, by the location based tables of moves.py.
+REFERENCE_SINGLE_MOVES = {
+    RP: DOWN_SINGLE_MOVES,
+    RK: KING_SINGLE_MOVES,
+    BP: UP_SINGLE_MOVES,
+    BK: KING_SINGLE_MOVES,
+}
+
+
+def reference_capture_sequences(state, origin_loc):
+    """The capture sequences of the tool on origin_loc by the reference implementation, without the
+    repetitions that reach the same target having jumped the same tools.
+    :return: A list of (target location, list of jumped locations), in generation order.
+    """
+    tool = state.board[origin_loc]
+    seqs = []
+    seen = set()
+    for target, jumped in state.find_all_capture_sequence(origin_loc, origin_loc, TOOL_CAPTURE_MOVES[tool], []):
+        if jumped and (target, frozenset(jumped)) not in seen:
+            seen.add((target, frozenset(jumped)))
+            seqs.append((target, jumped))
+    return seqs
+
+
+def reference_moves(state):
+    """The possible moves of a state by the reference implementation: the capture sequences of
+    find_all_capture_sequence, or the single moves of the location based tables if there are none.
+    :return: A list of GameMove objects, the moves of get_possible_moves but not necessarily in its order.
+    """
+    board = state.board
+    my_tools = MY_COLORS[state.curr_player]
+    origins = [(tool, SQUARE_LOCS[sq]) for tool in my_tools for sq in range(len(SQUARE_LOCS))
+               if board[SQUARE_LOCS[sq]] == tool]
+    capture_moves = [GameMove(tool, origin, target, jumped)
+                     for tool, origin in origins
+                     for target, jumped in reference_capture_sequences(state, origin)]
+    if capture_moves:
+        return capture_moves
+    return [GameMove(tool, origin, target)
+            for tool, origin in origins
+            for target in REFERENCE_SINGLE_MOVES[tool][origin]
+            if board[target] == EM]
+
+
+def generated_capture_sequences(state, origin_loc):
+    """The capture sequences of the tool on origin_loc by the move generator.
+    :return: A list of (target location, list of jumped locations), in generation order.
+    """
+    tool = state.board[origin_loc]
+    seqs = []
+    for target_sq, jumped_mask, jumped in state.iter_capture_sequences(LOC_SQUARES[origin_loc], tool):
+        if jumped_mask != sum(1 << LOC_SQUARES[loc] for loc in jumped):
+            raise AssertionError('Jumped mask does not match the jumped locations')
+        seqs.append((SQUARE_LOCS[target_sq], jumped))
+    return seqs
+
+
+def check_lazy_moves(state, other_moves):
+    """Checks iter_moves, has_legal_move and is_legal_move of a state against its get_possible_moves.
+    :param other_moves: Moves of other positions, used as (mostly illegal) hash moves.
+    :raises AssertionError: If they differ.
+    """
+    possible_moves = state.get_possible_moves()
+    if list(state.iter_moves()) != possible_moves:
+        raise AssertionError('iter_moves differs from get_possible_moves')
+    if state.has_legal_move() != bool(possible_moves):
+        raise AssertionError('has_legal_move is wrong')
+    if state.generate_possible_moves() != possible_moves:
+        raise AssertionError('get_possible_moves returned a stale list')
+    for hash_move in possible_moves + other_moves:
+        is_legal = hash_move in possible_moves
+        if state.is_legal_move(hash_move) != is_legal:
+            raise AssertionError('is_legal_move is wrong for {}'.format(hash_move))
+        moves = list(state.iter_moves(hash_move))
+        expected = [hash_move] + [move for move in possible_moves if move != hash_move] if is_legal else possible_moves
+        if moves != expected:
+            raise AssertionError('iter_moves with hash move {} is wrong'.format(hash_move))
+
+
+def check_move_generation(games, seed):
+    """Plays random games, checking the capture sequences of every capture origin of every position,
+    and its lazily generated moves.
+    :return: The number of positions checked.
+    :raises AssertionError: On the first position where the implementations differ.
+    """
+    rng = random.Random(seed)
+    positions = 0
+    for _ in range(games):
+        state = GameState()
+        # The moves of the previous positions of the same player are tried as hash moves.
+        previous_moves = [[], []]
+        while True:
+            my_mask, _ = state.player_masks()
+            for sq in iter_squares(my_mask):
+                origin = SQUARE_LOCS[sq]
+                expected = reference_capture_sequences(state, origin)
+                actual = generated_capture_sequences(state, origin)
+                if actual != expected:
+                    state.draw_board()
+                    raise AssertionError('Capture sequences from {} differ:\nreference: {}\ngenerated: {}'.format(
+                        origin, expected, actual))
+            check_lazy_moves(state, previous_moves[0])
+            positions += 1
+
+            possible_moves = state.get_possible_moves()
+            previous_moves = [previous_moves[1], possible_moves]
+            if not possible_moves or state.turns_since_last_jump >= MAX_TURNS_NO_JUMP:
+                break
+            state.perform_move(rng.choice(possible_moves))
+    return positions
+
+
+def move_key(move):
+    """:return: A GameMove as a move of the batch simulator: (origin square, target square, jumped mask)."""
+    return (LOC_SQUARES[move.origin_loc], LOC_SQUARES[move.target_loc],
+            sum(1 << LOC_SQUARES[loc] for loc in move.jumped_locs))
+
+
+def check_batch_simulator(games, seed):
+    """Plays random games with the batch simulator, all of them in one batch, checking the moves it
+    generates for every board against GameState.get_possible_moves, the boards after the moves it makes
+    against GameState.perform_move, and the results of the games against the rules of run_game.GameRunner.
+    :return: The number of positions checked.
+    :raises AssertionError: On the first board where they differ.
+    """
+    import numpy as np
+    from checkers.batch import GameBatch, BATCH_RESULTS, ONGOING
+
+    rng = np.random.default_rng(seed)
+    batch = GameBatch(games)
+    positions = 0
+    while (batch.result == ONGOING).any():
+        states = {i: batch.state(i) for i in np.flatnonzero(batch.result == ONGOING)}
+        moves, chosen = batch.step(rng)
+        for i, state in states.items():
+            possible_moves = {move_key(move): move for move in state.get_possible_moves()}
+            batch_moves = moves.moves_of(i)
+            if sorted(batch_moves) != sorted(possible_moves):
+                state.draw_board()
+                raise AssertionError('Moves of board {} differ:\nGameState: {}\nbatch: {}'.format(
+                    i, sorted(possible_moves), sorted(batch_moves)))
+            positions += 1
+            if not possible_moves:
+                expected_result = BLACK_PLAYER if state.curr_player == RED_PLAYER else RED_PLAYER
+            else:
+                state.perform_move(possible_moves[batch_moves[chosen[i] - moves.starts[i]]])
+                if batch.state(i).to_bytes() != state.to_bytes():
+                    state.draw_board()
+                    raise AssertionError('Board {} differs after the move'.format(i))
+                expected_result = TIE if state.turns_since_last_jump >= MAX_TURNS_NO_JUMP else None
+            actual_result = BATCH_RESULTS.get(int(batch.result[i]))
+            if actual_result != expected_result:
+                raise AssertionError('Board {} ended with {} instead of {}'.format(i, actual_result, expected_result))
+    return positions
+
+
+if __name__ == '__main__':
+    try:
+        games, seed = int(sys.argv[1]), int(sys.argv[2])
+        check_batch = len(sys.argv) > 3 and sys.argv[3] == 'batch'
+    except (IndexError, ValueError):
+        print("""Syntax: {0} games seed [batch]
+For example: {0} 200 0""".format(sys.argv[0]))
+        sys.exit(2)
+
+    if check_batch:
+        positions = check_batch_simulator(games, seed)
+        print('The batch simulator matches in {} positions of {} games.'.format(positions, games))
+    else:
+        positions = check_move_generation(games, seed)
+        print('Move generation matches in {} positions of {} games.'.format(positions, games))
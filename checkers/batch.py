@@ -0,0 +1,258 @@
+"""
+This file holds a batch simulator: thousands of games stepped together, for playout heavy work such as
+generating self-play data or Monte Carlo evaluation.
+The boards are NumPy arrays of the masks of bitboard.py. The moves of all the boards are generated, and the
+chosen moves made, with array operations, by the rules of GameState and run_game.GameRunner: captures are
+forced, a capture is a complete multi-jump sequence, pawns are promoted on the back row, a player without
+moves loses and a game is tied after MAX_TURNS_NO_JUMP turns without a jump.
+Only this module needs NumPy. check_moves.py checks it against GameState.
+"""
+
+#===============================================================================
+# Imports
+#===============================================================================
+
+import numpy as np
+from .consts import RED_PLAYER, BLACK_PLAYER, TIE, MAX_TURNS_NO_JUMP, RP, RK, BP, BK
+from .bitboard import (NUM_SQUARES, NEIGHBOR, TOOL_DIRECTIONS, PROMOTION_MASK, RED_START_MASK,
+                       BLACK_START_MASK)
+from .board import GameState
+
+#===============================================================================
+# Globals
+#===============================================================================
+
+# The players by their index in GameBatch.player.
+BATCH_PLAYERS = (RED_PLAYER, BLACK_PLAYER)
+
+# The results of the games in GameBatch.result.
+ONGOING = -1
+RED_WON = 0
+BLACK_WON = 1
+TIED = 2
+BATCH_RESULTS = {RED_WON: RED_PLAYER, BLACK_WON: BLACK_PLAYER, TIED: TIE}
+
+MAX_PLIES_NO_JUMP = int(2 * MAX_TURNS_NO_JUMP)
+
+_SQUARES = np.arange(NUM_SQUARES, dtype=np.int64)
+_DIRECTIONS = range(len(NEIGHBOR))
+
+# _NEIGHBORS[direction, square] is the neighbouring square in that direction, and _LANDINGS[direction, square]
+# the square after it (where a jump lands), or -1 off the board.
+_NEIGHBORS = np.array([[-1 if sq is None else sq for sq in NEIGHBOR[d]] for d in _DIRECTIONS], dtype=np.int64)
+_LANDINGS = np.array([[-1 if sq is None or NEIGHBOR[d][sq] is None else NEIGHBOR[d][sq]
+                       for sq in NEIGHBOR[d]] for d in _DIRECTIONS], dtype=np.int64)
+
+# _MOVES_IN[player index, is king, direction] tells whether the tool moves in the direction.
+_MOVES_IN = np.array([[[d in TOOL_DIRECTIONS[tool] for d in _DIRECTIONS] for tool in tools]
+                      for tools in ((RP, RK), (BP, BK))], dtype=bool)
+
+_PROMOTION_MASKS = np.array([PROMOTION_MASK[player] for player in BATCH_PLAYERS], dtype=np.int64)
+
+#===============================================================================
+# Moves
+#===============================================================================
+
+class BatchMoves:
+
+    def __init__(self, size, board, origin, target, jumped):
+        """The moves of the boards of a GameBatch, in flat arrays sorted by board: the board of every move,
+        its origin and target squares, and the mask of the tools it jumps (0 for an ordinary move).
+        A capture sequence is a single move, and sequences that end on the same square having jumped the same
+        tools are the same move, as in GameState.get_possible_moves.
+
+        :param size: The number of boards of the batch.
+        """
+        self.board = board
+        self.origin = origin
+        self.target = target
+        self.jumped = jumped
+        # The moves of board i are from starts[i] to starts[i] + counts[i].
+        self.counts = np.bincount(board, minlength=size)
+        self.starts = np.cumsum(self.counts) - self.counts
+
+    def __len__(self):
+        return len(self.board)
+
+    def moves_of(self, i):
+        """:return: The moves of board i, as a list of (origin square, target square, jumped mask)."""
+        start, end = self.starts[i], self.starts[i] + self.counts[i]
+        return list(zip(self.origin[start:end].tolist(), self.target[start:end].tolist(),
+                        self.jumped[start:end].tolist()))
+
+    def choose_random(self, rng):
+        """Chooses a move for every board with moves, uniformly at random.
+        :param rng: A numpy.random.Generator.
+        :return: An array with the index of the move of every board, or -1 for boards without moves.
+        """
+        chosen = np.full(len(self.counts), -1, dtype=np.int64)
+        boards = np.flatnonzero(self.counts)
+        chosen[boards] = self.starts[boards] + (rng.random(len(boards)) * self.counts[boards]).astype(np.int64)
+        return chosen
+
+    def choose_weighted(self, weights, rng):
+        """Chooses a move for every board with moves, at random by weights (e.g. of a policy).
+        :param weights: An array with a non negative weight for every move.
+        :param rng: A numpy.random.Generator.
+        :return: An array with the index of the move of every board, or -1 for boards without moves.
+        """
+        chosen = np.full(len(self.counts), -1, dtype=np.int64)
+        boards = np.flatnonzero(self.counts)
+        cumulative = np.cumsum(weights, dtype=np.float64)
+        starts, ends = self.starts[boards], self.starts[boards] + self.counts[boards]
+        before = np.where(starts > 0, cumulative[starts - 1], 0.0)
+        points = before + rng.random(len(boards)) * (cumulative[ends - 1] - before)
+        chosen[boards] = np.clip(np.searchsorted(cumulative, points, side='right'), starts, ends - 1)
+        return chosen
+
+#===============================================================================
+# Batch
+#===============================================================================
+
+def _bits(masks, squares):
+    """:return: Whether the squares are set in the masks, element by element."""
+    return (masks >> squares) & 1 == 1
+
+
+class GameBatch:
+
+    def __init__(self, size):
+        """A batch of games, all in the starting position.
+        The arrays, one entry per board: red, black and king masks (see bitboard.py), player (the index in
+        BATCH_PLAYERS of the player to move), plies (since the last jump), result (ONGOING, RED_WON,
+        BLACK_WON or TIED) and moves (the number of moves made).
+        """
+        self.red = np.full(size, RED_START_MASK, dtype=np.int64)
+        self.black = np.full(size, BLACK_START_MASK, dtype=np.int64)
+        self.king = np.zeros(size, dtype=np.int64)
+        self.player = np.zeros(size, dtype=np.int64)
+        self.plies = np.zeros(size, dtype=np.int64)
+        self.result = np.full(size, ONGOING, dtype=np.int64)
+        self.moves = np.zeros(size, dtype=np.int64)
+
+    @classmethod
+    def from_states(cls, states):
+        """:return: A new GameBatch of the positions of GameStates."""
+        batch = cls(len(states))
+        for i, state in enumerate(states):
+            batch.red[i], batch.black[i], batch.king[i] = state.red_mask, state.black_mask, state.king_mask
+            batch.player[i] = BATCH_PLAYERS.index(state.curr_player)
+            batch.plies[i] = int(state.turns_since_last_jump * 2)
+        return batch
+
+    def __len__(self):
+        return len(self.red)
+
+    def state(self, i):
+        """:return: A GameState of board i."""
+        return GameState.from_masks(int(self.red[i]), int(self.black[i]), int(self.king[i]),
+                                    BATCH_PLAYERS[self.player[i]], int(self.plies[i]) / 2)
+
+    def generate_moves(self):
+        """Generates the moves of every ongoing board.
+        :return: A BatchMoves.
+        """
+        size = len(self)
+        red_to_move = self.player == 0
+        mine = np.where(red_to_move, self.red, self.black)
+        theirs = np.where(red_to_move, self.black, self.red)
+        empty = ~(self.red | self.black)
+
+        # Every tool of the player to move starts a partial capture sequence, extended a jump at a time.
+        board, origin = np.nonzero(_bits(mine[:, None], _SQUARES) & (self.result == ONGOING)[:, None])
+        king = _bits(self.king[board], origin)
+        square = origin
+        jumped = np.zeros(len(board), dtype=np.int64)
+        no_moves = np.zeros(0, dtype=np.int64)
+        captures = [(no_moves, no_moves, no_moves, no_moves)]
+        while len(board):
+            # The origin is vacated by the jumping tool, so it may be landed on again.
+            free = empty[board] | (np.int64(1) << origin)
+            extended = np.zeros(len(board), dtype=bool)
+            next_partials = []
+            for d in _DIRECTIONS:
+                over, landing = _NEIGHBORS[d, square], _LANDINGS[d, square]
+                can_jump = _MOVES_IN[self.player[board], king.astype(np.int64), d] & (landing >= 0)
+                over_bit = np.int64(1) << np.maximum(over, 0)
+                can_jump &= (theirs[board] & over_bit != 0) & (jumped & over_bit == 0)
+                can_jump &= _bits(free, np.maximum(landing, 0))
+                extended |= can_jump
+                next_partials.append((board[can_jump], origin[can_jump], king[can_jump], landing[can_jump],
+                                      jumped[can_jump] | over_bit[can_jump]))
+            done = ~extended & (jumped != 0)
+            captures.append((board[done], origin[done], square[done], jumped[done]))
+            board, origin, king, square, jumped = (np.concatenate(arrays) for arrays in zip(*next_partials))
+
+        board, origin, target, jumped = (np.concatenate(arrays) for arrays in zip(*captures))
+        # The same move reached along different paths once, sorted by board.
+        board, origin, target, jumped = np.unique(np.stack([board, origin, target, jumped], axis=1), axis=0).T
+
+        # Ordinary moves, on the ongoing boards without captures.
+        can_move = (self.result == ONGOING) & (np.bincount(board, minlength=size) == 0)
+        step_boards, step_origins = np.nonzero(_bits(mine[:, None], _SQUARES) & can_move[:, None])
+        step_kings = _bits(self.king[step_boards], step_origins).astype(np.int64)
+        steps = []
+        for d in _DIRECTIONS:
+            step_targets = _NEIGHBORS[d, step_origins]
+            can_step = _MOVES_IN[self.player[step_boards], step_kings, d] & (step_targets >= 0)
+            can_step &= _bits(empty[step_boards], np.maximum(step_targets, 0))
+            steps.append((step_boards[can_step], step_origins[can_step], step_targets[can_step]))
+        step_boards, step_origins, step_targets = (np.concatenate(arrays) for arrays in zip(*steps))
+
+        board = np.concatenate([board, step_boards])
+        origin = np.concatenate([origin, step_origins])
+        target = np.concatenate([target, step_targets])
+        jumped = np.concatenate([jumped, np.zeros(len(step_boards), dtype=np.int64)])
+        order = np.argsort(board, kind='stable')
+        return BatchMoves(size, board[order], origin[order], target[order], jumped[order])
+
+    def apply_moves(self, moves, chosen):
+        """Makes the chosen moves, and ends the games of the ongoing boards without moves, and the games with
+        MAX_TURNS_NO_JUMP turns without a jump.
+        :param moves: The BatchMoves of the boards (see generate_moves).
+        :param chosen: An array with the index in moves of the move of every board, or -1 for no move.
+        """
+        stuck = (self.result == ONGOING) & (moves.counts == 0)
+        self.result[stuck] = 1 - self.player[stuck]
+
+        i = chosen[chosen >= 0]
+        board = moves.board[i]
+        origin_bit = np.int64(1) << moves.origin[i]
+        target_bit = np.int64(1) << moves.target[i]
+        jumped = moves.jumped[i]
+        player = self.player[board]
+        red_moves = player == 0
+        red, black, king = self.red[board], self.black[board], self.king[board]
+        # origin and target are the same square when a king jumps in a circle.
+        self.red[board] = np.where(red_moves, (red & ~origin_bit) | target_bit, red & ~jumped)
+        self.black[board] = np.where(red_moves, black & ~jumped, (black & ~origin_bit) | target_bit)
+        # Kings stay kings, and pawns are promoted on their back row.
+        crowned = (king & origin_bit != 0) | (target_bit & _PROMOTION_MASKS[player] != 0)
+        self.king[board] = (king & ~(origin_bit | jumped)) | np.where(crowned, target_bit, 0)
+        self.plies[board] = np.where(jumped != 0, 0, self.plies[board] + 1)
+        self.player[board] = 1 - player
+        self.moves[board] += 1
+        self.result[board[self.plies[board] >= MAX_PLIES_NO_JUMP]] = TIED
+
+    def step(self, rng, policy=None):
+        """Makes a move on every ongoing board: at random, or by the weights of a policy.
+        :param rng: A numpy.random.Generator.
+        :param policy: An optional function of the batch and its BatchMoves, returning a non negative weight
+                       for every move.
+        :return: A tuple: (The BatchMoves, The index of the move made on every board, or -1)
+        """
+        moves = self.generate_moves()
+        if policy is None:
+            chosen = moves.choose_random(rng)
+        else:
+            chosen = moves.choose_weighted(policy(self, moves), rng)
+        self.apply_moves(moves, chosen)
+        return moves, chosen
+
+    def play(self, rng, policy=None):
+        """Plays all the games to their end, see step.
+        :return: The result array.
+        """
+        while (self.result == ONGOING).any():
+            self.step(rng, policy)
+        return self.result
@@ -0,0 +1,218 @@
+"""
+This file holds the bitboard layout of the board: square numbering, bit masks
+and the per-square step and jump tables used by the move generator.
+"""
+
+#===============================================================================
+# Imports
+#===============================================================================
+
+import math
+from .consts import (RED_PLAYER, BLACK_PLAYER,
+                     BOARD_ROWS, BOARD_COLS,
+                     IS_BLACK_TILE, BACK_ROW,
+                     CENTER_BOARD, MAX_DISTANCE_FROM_CENTER,
+                     RP, RK, BP, BK)
+from .moves import (GameMove,
+                    DOWN_RIGHT_SINGLE_MOVES, DOWN_LEFT_SINGLE_MOVES,
+                    UP_RIGHT_SINGLE_MOVES, UP_LEFT_SINGLE_MOVES)
+
+#===============================================================================
+# Squares
+#===============================================================================
+
+# Only the black tiles are playable. They are numbered 0..31 in row-major order,
+# so iterating the set bits of a mask from the lowest one up visits the squares
+# in the same order as iterating the board row by row.
+SQUARE_LOCS = [(i,j)
+               for i in range(BOARD_ROWS)
+               for j in range(BOARD_COLS)
+               if IS_BLACK_TILE((i,j))]
+NUM_SQUARES = len(SQUARE_LOCS)
+FULL_MASK = (1 << NUM_SQUARES) - 1
+
+# Location (2-tuple) to square index and to square bit.
+LOC_SQUARES = {loc : sq for sq, loc in enumerate(SQUARE_LOCS)}
+LOC_BITS = {loc : 1 << sq for sq, loc in enumerate(SQUARE_LOCS)}
+
+def squares_mask(locs):
+    """Returns the bit mask of the given locations."""
+    mask = 0
+    for loc in locs:
+        mask |= LOC_BITS[loc]
+    return mask
+
+def iter_squares(mask):
+    """Yields the square indices of the set bits in mask, from the lowest up."""
+    while mask:
+        bit = mask & -mask
+        mask ^= bit
+        yield bit.bit_length() - 1
+
+# Masks of the row the pawns of each player are promoted on.
+PROMOTION_MASK = {
+    RED_PLAYER: squares_mask(loc for loc in SQUARE_LOCS if loc[0] == BACK_ROW[RED_PLAYER]),
+    BLACK_PLAYER: squares_mask(loc for loc in SQUARE_LOCS if loc[0] == BACK_ROW[BLACK_PLAYER]),
+}
+
+# How central each location is: MAX_DISTANCE_FROM_CENTER minus its distance from the center.
+LOC_CENTRALITY = {(i,j) : MAX_DISTANCE_FROM_CENTER - math.sqrt(pow(abs(i - CENTER_BOARD), 2) +
+                                                               pow(abs(j - CENTER_BOARD), 2))
+                  for i, j in SQUARE_LOCS}
+
+# Starting position: three rows of pawns for each player.
+RED_START_MASK = squares_mask(loc for loc in SQUARE_LOCS if loc[0] < 3)
+BLACK_START_MASK = squares_mask(loc for loc in SQUARE_LOCS if loc[0] >= BOARD_ROWS - 3)
+
+#===============================================================================
+# Directions
+#===============================================================================
+
+DOWN_RIGHT, DOWN_LEFT, UP_RIGHT, UP_LEFT = range(4)
+
+OPPOSITE_DIRECTION = {
+    DOWN_RIGHT: UP_LEFT,
+    DOWN_LEFT: UP_RIGHT,
+    UP_RIGHT: DOWN_LEFT,
+    UP_LEFT: DOWN_RIGHT,
+}
+
+_DIRECTION_SINGLE_MOVES = {
+    DOWN_RIGHT: DOWN_RIGHT_SINGLE_MOVES,
+    DOWN_LEFT: DOWN_LEFT_SINGLE_MOVES,
+    UP_RIGHT: UP_RIGHT_SINGLE_MOVES,
+    UP_LEFT: UP_LEFT_SINGLE_MOVES,
+}
+
+# NEIGHBOR[direction][square] is the neighbouring square in that direction, or None
+# when the square is on the edge of the board.
+NEIGHBOR = {d : [LOC_SQUARES[moves[loc]] if loc in moves else None
+                 for loc in SQUARE_LOCS]
+            for d, moves in _DIRECTION_SINGLE_MOVES.items()}
+
+def _calc_shifts(neighbors):
+    """Groups the squares by the index offset of their neighbour, so a whole mask can be
+    moved one step in a direction with a shift per group.
+    :return: A list of (source mask, left shift, right shift) triplets.
+    """
+    groups = {}
+    for sq, neighbor in enumerate(neighbors):
+        if neighbor is not None:
+            groups[neighbor - sq] = groups.get(neighbor - sq, 0) | (1 << sq)
+    return [(mask, max(delta, 0), max(-delta, 0)) for delta, mask in sorted(groups.items())]
+
+SHIFTS = {d : _calc_shifts(neighbors) for d, neighbors in NEIGHBOR.items()}
+
+def shift_mask(mask, direction):
+    """Moves every set bit in mask one step in the given direction. Bits that would
+    leave the board are dropped.
+    """
+    result = 0
+    for source, left, right in SHIFTS[direction]:
+        result |= ((mask & source) << left) >> right
+    return result
+
+# The directions each tool moves in, in the order the moves are generated.
+TOOL_DIRECTIONS = {
+    RP: (DOWN_RIGHT, DOWN_LEFT),
+    BP: (UP_RIGHT, UP_LEFT),
+    RK: (UP_RIGHT, UP_LEFT, DOWN_RIGHT, DOWN_LEFT),
+    BK: (UP_RIGHT, UP_LEFT, DOWN_RIGHT, DOWN_LEFT),
+}
+
+#===============================================================================
+# Step and jump tables
+#===============================================================================
+
+def _calc_steps(directions):
+    return [[(1 << NEIGHBOR[d][sq], SQUARE_LOCS[NEIGHBOR[d][sq]])
+             for d in directions
+             if NEIGHBOR[d][sq] is not None]
+            for sq in range(NUM_SQUARES)]
+
+def _calc_jumps(directions):
+    return [[(1 << NEIGHBOR[d][sq], 1 << NEIGHBOR[d][NEIGHBOR[d][sq]],
+              NEIGHBOR[d][NEIGHBOR[d][sq]], SQUARE_LOCS[NEIGHBOR[d][sq]])
+             for d in directions
+             if NEIGHBOR[d][sq] is not None and NEIGHBOR[d][NEIGHBOR[d][sq]] is not None]
+            for sq in range(NUM_SQUARES)]
+
+# TOOL_STEPS[tool][square] is a list of (target bit, target location) for every
+# ordinary move of that tool from that square.
+TOOL_STEPS = {tool : _calc_steps(directions) for tool, directions in TOOL_DIRECTIONS.items()}
+
+# TOOL_JUMPS[tool][square] is a list of (jumped bit, landing bit, landing square,
+# jumped location) for every single jump of that tool from that square.
+TOOL_JUMPS = {tool : _calc_jumps(directions) for tool, directions in TOOL_DIRECTIONS.items()}
+
+#===============================================================================
+# Mask move generation
+#===============================================================================
+
+def movers_mask(pieces, directions, empty):
+    """Returns the pieces that have at least one ordinary move in the given directions."""
+    movers = 0
+    for d in directions:
+        movers |= pieces & shift_mask(empty, OPPOSITE_DIRECTION[d])
+    return movers
+
+def jumpers_mask(pieces, directions, opponent, empty):
+    """Returns the pieces that have at least one jump in the given directions."""
+    jumpers = 0
+    for d in directions:
+        back = OPPOSITE_DIRECTION[d]
+        jumpers |= pieces & shift_mask(opponent & shift_mask(empty, back), back)
+    return jumpers
+
+#===============================================================================
+# Move packing
+#===============================================================================
+
+# A move packed into an int, so it can be kept outside of Python objects (e.g. in shared memory):
+# bit 0 is set for any move (0 is no move), bits 1-2 the tool, bits 3-7 the origin square,
+# bits 8-11 the number of jumps and from bit 12 on the direction of every jump (2 bits each),
+# or of the single step when there are no jumps.
+PACKED_TOOLS = (RP, RK, BP, BK)
+PACKED_TOOL_INDEX = {tool : i for i, tool in enumerate(PACKED_TOOLS)}
+PACKED_MOVE_BITS = 12 + 2 * 12
+
+def _direction_to(sq, to_sq):
+    for d, neighbors in NEIGHBOR.items():
+        if neighbors[sq] == to_sq:
+            return d
+    raise ValueError('Square {} is not next to square {}'.format(to_sq, sq))
+
+def pack_move(move):
+    """Packs a move into an int of at most PACKED_MOVE_BITS bits.
+    :return: The packed move, or 0 for None.
+    """
+    if move is None:
+        return 0
+    sq = LOC_SQUARES[move.origin_loc]
+    code = 1 | (PACKED_TOOL_INDEX[move.player_type] << 1) | (sq << 3) | (len(move.jumped_locs) << 8)
+    if not move.jumped_locs:
+        return code | (_direction_to(sq, LOC_SQUARES[move.target_loc]) << 12)
+    for i, jumped_loc in enumerate(move.jumped_locs):
+        d = _direction_to(sq, LOC_SQUARES[jumped_loc])
+        code |= d << (12 + 2 * i)
+        sq = NEIGHBOR[d][NEIGHBOR[d][sq]]
+    return code
+
+def unpack_move(code):
+    """Unpacks a move packed by pack_move.
+    :return: A GameMove, or None for 0.
+    """
+    if not code & 1:
+        return None
+    tool = PACKED_TOOLS[(code >> 1) & 3]
+    sq = (code >> 3) & 31
+    origin_loc = SQUARE_LOCS[sq]
+    jumps = (code >> 8) & 15
+    if not jumps:
+        return GameMove(tool, origin_loc, SQUARE_LOCS[NEIGHBOR[(code >> 12) & 3][sq]])
+    jumped_locs = []
+    for i in range(jumps):
+        d = (code >> (12 + 2 * i)) & 3
+        jumped_locs.append(SQUARE_LOCS[NEIGHBOR[d][sq]])
+        sq = NEIGHBOR[d][NEIGHBOR[d][sq]]
+    return GameMove(tool, origin_loc, SQUARE_LOCS[sq], jumped_locs)
@@ -1,70 +1,245 @@
 """A game-specific implementations of utility functions.
 """
 from __future__ import print_function, division
+import struct
 from .consts import *
 from .moves import *
+from .bitboard import (FULL_MASK, SQUARE_LOCS, LOC_BITS, LOC_CENTRALITY, PROMOTION_MASK,
+                       RED_START_MASK, BLACK_START_MASK,
+                       TOOL_DIRECTIONS, TOOL_STEPS, TOOL_JUMPS,
+                       iter_squares, movers_mask, jumpers_mask)
+from .zobrist import TOOL_LOC_KEYS, BLACK_TURN_KEY, calc_zobrist_key
+
+# The packed form of a state (see GameState.to_bytes): the red, black and king masks, the player to move and the
+# turns since the last jump, counted in plies.
+PACKED_STATE = struct.Struct('<IIIBB')
+PACKED_PLAYERS = (RED_PLAYER, BLACK_PLAYER)
 
 
 class GameState:
+    # Debugging aid for hash collisions. When True, every perform_move checks the incremental
+    # Zobrist key against a full recalculation, and __eq__ compares the full boards as well as
+    # the keys, counting keys that are equal for different positions in hash_collisions.
+    verify_zobrist = False
+    hash_collisions = 0
+    # Debugging aid for the evaluation features. When True, every perform_move checks them against
+    # a full recalculation.
+    verify_features = False
+
     def __init__(self):
         """ Initializing the board and current player.
+        The board is kept as three 32-bit masks over the black tiles (see bitboard.py):
+        the red tools, the black tools and the kings of both colors.
         """
-        self.board = {(i,j) : EM 
-                      for j in range(BOARD_COLS) 
-                      for i in range(BOARD_ROWS)}
-        
-        for i in range(3):
-            for j in range(BOARD_COLS):
-                if IS_BLACK_TILE((i,j)):
-                    self.board[(i,j)] = RP
-        
-        for i in range(3):
-            cur_i = BOARD_ROWS - i - 1
-            for j in range(BOARD_COLS):
-                if IS_BLACK_TILE((cur_i,j)):
-                    self.board[(cur_i,j)] = BP
-                    
+        self.red_mask = RED_START_MASK
+        self.black_mask = BLACK_START_MASK
+        self.king_mask = 0
+
         self.curr_player = RED_PLAYER
         self.turns_since_last_jump = 0
 
+        # Zobrist key of the position, kept up to date by perform_move and unmake_move.
+        self.zobrist_key = self.calc_zobrist_key()
+
+        # Evaluation features, kept up to date by perform_move and unmake_move so utility functions do not
+        # need to scan the board:
+        # piece_counts - tool (RP, RK, BP, BK) to the number of such tools on the board.
+        # row_sums - player to the sum of the rows of all its tools.
+        # king_centrality - player to the sum of LOC_CENTRALITY (see bitboard.py) of its kings.
+        # perform_move replaces a dict it changes by an updated copy, so never change them in place.
+        self.piece_counts, self.row_sums, self.king_centrality = self.calc_features()
+
+        # The last list get_possible_moves generated, and the key of the position it was generated for.
+        self.possible_moves_cache = None
+        self.possible_moves_cache_key = None
+
+    @classmethod
+    def from_masks(cls, red_mask, black_mask, king_mask, curr_player, turns_since_last_jump=0):
+        """Creating a state of any position, given by its masks (see bitboard.py).
+        :return: A new GameState.
+        """
+        # Not through __init__, which would set up the initial position only for it to be replaced.
+        state = cls.__new__(cls)
+        state.red_mask = red_mask
+        state.black_mask = black_mask
+        state.king_mask = king_mask
+        state.curr_player = curr_player
+        state.turns_since_last_jump = turns_since_last_jump
+        state.zobrist_key = state.calc_zobrist_key()
+        state.piece_counts, state.row_sums, state.king_centrality = state.calc_features()
+        state.possible_moves_cache = None
+        state.possible_moves_cache_key = None
+        return state
+
+    def to_bytes(self):
+        """Packs the position into PACKED_STATE.size bytes. The rest of the state (the Zobrist key, the
+        evaluation features) follows from the position, and from_bytes calculates it again.
+        """
+        return PACKED_STATE.pack(self.red_mask, self.black_mask, self.king_mask,
+                                 PACKED_PLAYERS.index(self.curr_player), int(self.turns_since_last_jump * 2))
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Unpacks a state packed by to_bytes.
+        :return: A new GameState.
+        """
+        red_mask, black_mask, king_mask, player, plies_since_last_jump = PACKED_STATE.unpack(data)
+        return cls.from_masks(red_mask, black_mask, king_mask, PACKED_PLAYERS[player], plies_since_last_jump / 2)
+
+    def __reduce__(self):
+        # Pickled (e.g. to other processes) in the packed form.
+        return _state_from_bytes, (self.to_bytes(),)
+
+    @property
+    def board(self):
+        """A dict from every (row, col) location to the tool on it (or EM).
+        This is a snapshot built from the masks; changing it does not change the state.
+        """
+        board = dict(EMPTY_BOARD)
+        for tool, mask in ((RP, self.red_mask & ~self.king_mask),
+                           (RK, self.red_mask & self.king_mask),
+                           (BP, self.black_mask & ~self.king_mask),
+                           (BK, self.black_mask & self.king_mask)):
+            for sq in iter_squares(mask):
+                board[SQUARE_LOCS[sq]] = tool
+        return board
+
+    def calc_zobrist_key(self):
+        """Calculates the Zobrist key of this state from scratch (see zobrist.py).
+        """
+        return calc_zobrist_key(self.red_mask, self.black_mask, self.king_mask, self.curr_player)
+
+    def calc_features(self):
+        """Calculating the evaluation features from scratch.
+        :return: A 3-tuple of the piece_counts, row_sums and king_centrality dicts (see __init__).
+        """
+        piece_counts = {}
+        row_sums = {RED_PLAYER: 0, BLACK_PLAYER: 0}
+        king_centrality = {RED_PLAYER: 0, BLACK_PLAYER: 0}
+        for player, mask in ((RED_PLAYER, self.red_mask), (BLACK_PLAYER, self.black_mask)):
+            for tool, tool_mask in ((PAWN_COLOR[player], mask & ~self.king_mask),
+                                    (KING_COLOR[player], mask & self.king_mask)):
+                piece_counts[tool] = 0
+                for sq in iter_squares(tool_mask):
+                    loc = SQUARE_LOCS[sq]
+                    piece_counts[tool] += 1
+                    row_sums[player] += loc[0]
+                    if tool == KING_COLOR[player]:
+                        king_centrality[player] += LOC_CENTRALITY[loc]
+        return piece_counts, row_sums, king_centrality
+
+    def player_masks(self):
+        """:return: A 2-tuple of the masks of the current player's tools and of the opponent's tools.
+        """
+        if self.curr_player == RED_PLAYER:
+            return self.red_mask, self.black_mask
+        return self.black_mask, self.red_mask
+
+    def empty_mask(self):
+        return ~(self.red_mask | self.black_mask) & FULL_MASK
+
+    def tool_masks(self):
+        """:return: A 2-tuple of (tool, mask) pairs of the current player: its pawns, then its kings.
+        """
+        my_mask, _ = self.player_masks()
+        return ((PAWN_COLOR[self.curr_player], my_mask & ~self.king_mask),
+                (KING_COLOR[self.curr_player], my_mask & self.king_mask))
+
     def calc_single_moves(self):
         """Calculating all the possible single moves.
         :return: All the legitimate single moves for this game state.
         """
-        single_pawn_moves = [GameMove(self.board[i], i, j) 
-                             for (i, js) in PAWN_SINGLE_MOVES[self.curr_player].items()
-                             if self.board[i] == PAWN_COLOR[self.curr_player]
-                             for j in js
-                             if self.board[j] == EM]
-        single_king_moves = [GameMove(self.board[i], i, j)
-                             for (i, js) in KING_SINGLE_MOVES.items()
-                             if self.board[i] == KING_COLOR[self.curr_player]
-                             for j in js
-                             if self.board[j] == EM]
-        return single_pawn_moves + single_king_moves
+        empty = self.empty_mask()
+        single_moves = []
+        for tool, pieces in self.tool_masks():
+            steps = TOOL_STEPS[tool]
+            for sq in iter_squares(movers_mask(pieces, TOOL_DIRECTIONS[tool], empty)):
+                origin = SQUARE_LOCS[sq]
+                single_moves.extend(GameMove(tool, origin, target_loc)
+                                    for target_bit, target_loc in steps[sq]
+                                    if target_bit & empty)
+        return single_moves
 
     def calc_capture_moves(self):
         """Calculating all the possible capture moves, but only the first step.
         :return: All the legitimate single capture moves for this game state.
         """
-        capture_pawn_moves = [(i, j, k)
-                              for i, i_capts in PAWN_CAPTURE_MOVES[self.curr_player].items()
-                              if self.board[i] == PAWN_COLOR[self.curr_player]
-                              for j,k in i_capts
-                              if self.board[j] in OPPONENT_COLORS[self.curr_player]
-                              and self.board[k] == EM]
-        capture_king_moves = [(i, j, k)
-                              for i, i_capts in KING_CAPTURE_MOVES.items()
-                              if self.board[i] == KING_COLOR[self.curr_player]
-                              for j,k in i_capts
-                              if self.board[j] in OPPONENT_COLORS[self.curr_player]
-                              and self.board[k] == EM]
-        return capture_pawn_moves + capture_king_moves
-    
+        _, op_mask = self.player_masks()
+        empty = self.empty_mask()
+        capture_moves = []
+        for tool, pieces in self.tool_masks():
+            for sq in iter_squares(jumpers_mask(pieces, TOOL_DIRECTIONS[tool], op_mask, empty)):
+                origin = SQUARE_LOCS[sq]
+                capture_moves.extend((origin, j, k)
+                                     for j, k in TOOL_CAPTURE_MOVES[tool][origin]
+                                     if LOC_BITS[j] & op_mask and LOC_BITS[k] & empty)
+        return capture_moves
+
+    def iter_capture_sequences(self, origin_sq, tool):
+        """
+        Generating all the complete capture sequences of the tool standing on origin_sq.
+        The search walks TOOL_JUMPS depth first with an explicit stack, keeping the tools jumped so far
+        as a bit mask, and copies the jumped locations into a list only for complete sequences.
+        Sequences that end on the same square having jumped the same tools (e.g. a king going around a
+        loop in both directions) are the same move, so only the first of them is generated.
+
+        Arguments:
+        origin_sq: The square index (see bitboard.py) of the jumping tool.
+        tool: The jumping tool, RP, RK, BP or BK.
+
+        :return: A generator of 3-tuples:
+            [0] Sequence final square
+            [1] Mask of the jumped tools
+            [2] list of the jumped locations, in jump order
+        """
+        jumps = TOOL_JUMPS[tool]
+        _, op_mask = self.player_masks()
+        # The origin location is vacated by the jumping tool, so it may be landed on again.
+        free_mask = self.empty_mask() | (1 << origin_sq)
+
+        # The stack of the squares of the current partial sequence, with the jumped mask on reaching each
+        # square, the index of the next jump to try from it and whether any jump from it was possible.
+        squares = [origin_sq]
+        jumped_masks = [0]
+        next_jumps = [0]
+        extended = [False]
+        path = []
+        generated = set()
+        while squares:
+            sq = squares[-1]
+            jumped_mask = jumped_masks[-1]
+            sq_jumps = jumps[sq]
+            i = next_jumps[-1]
+            while i < len(sq_jumps):
+                jumped_bit, land_bit, land_sq, jumped_loc = sq_jumps[i]
+                i += 1
+                if jumped_bit & op_mask and land_bit & free_mask and not jumped_bit & jumped_mask:
+                    next_jumps[-1] = i
+                    extended[-1] = True
+                    squares.append(land_sq)
+                    jumped_masks.append(jumped_mask | jumped_bit)
+                    next_jumps.append(0)
+                    extended.append(False)
+                    path.append(jumped_loc)
+                    break
+            else:
+                # No more jumps from sq. If there were none at all, the sequence is complete.
+                if not extended[-1] and path and (sq, jumped_mask) not in generated:
+                    generated.add((sq, jumped_mask))
+                    yield sq, jumped_mask, list(path)
+                squares.pop()
+                jumped_masks.pop()
+                next_jumps.pop()
+                extended.pop()
+                if path:
+                    path.pop()
+
     def find_all_capture_sequence(self, origin_loc, cur_loc, possible_moves, already_jumped):
         """
         Calculating all possible capture sequences from cur_loc, using moves in
-        possible_moves, avoiding jumping locations in already_jumped
+        possible_moves, avoiding jumping locations in already_jumped.
+        This is the original recursive implementation. The move generator uses iter_capture_sequences;
+        this one is kept as the reference it is checked against (see check_moves.py).
         
         Arguments:
         cur_loc: 2-tuple containing origin location for jump sequence
@@ -75,10 +250,13 @@ class GameState:
             [0] Sequence final location
             [1] list of jumped tools by this sequence
         """
+        _, op_mask = self.player_masks()
+        # The origin location is vacated by the jumping tool, so it may be landed on again.
+        free_mask = self.empty_mask() | LOC_BITS[origin_loc]
         possible_next_jumps = [(jumped, next_loc)
                                for jumped, next_loc in possible_moves[cur_loc]
-                               if self.board[jumped] in OPPONENT_COLORS[self.curr_player] # Jumping opponent tool
-                               and (self.board[next_loc] == EM or next_loc == origin_loc)# Target location is empty
+                               if LOC_BITS[jumped] & op_mask # Jumping opponent tool
+                               and LOC_BITS[next_loc] & free_mask # Target location is empty
                                and jumped not in already_jumped] # I have not jumped this tool yet in this sequence
         
         capture_seqs = []
@@ -98,61 +276,269 @@ class GameState:
     def get_possible_moves(self):
         """Return a list of possible moves for this state.
         Each possible move is represented by GameMove object.
+        The list is remembered until the position changes, so asking again (e.g. after unmaking a move, or
+        on a copy of this state) does not generate it again. Do not change the returned list.
+        """
+        if self.possible_moves_cache_key == self.zobrist_key:
+            return self.possible_moves_cache
+        possible_moves = self.generate_possible_moves()
+        self.possible_moves_cache = possible_moves
+        self.possible_moves_cache_key = self.zobrist_key
+        return possible_moves
+
+    def generate_possible_moves(self):
+        """Generating the list of possible moves, see get_possible_moves.
         """
-        possible_capture_moves = self.calc_capture_moves()
-        if possible_capture_moves:
-            capture_origins = set(origin for origin,_,_ in possible_capture_moves)
-            capture_seqs = []
-            for origin in capture_origins:
-                cur_seqs = self.find_all_capture_sequence(origin, origin,
-                                                          TOOL_CAPTURE_MOVES[self.board[origin]], 
-                                                          [])
-                for target, seq in cur_seqs:
-                    capture_seqs.append(GameMove(self.board[origin], origin, target, seq))
-                    
+        _, op_mask = self.player_masks()
+        empty = self.empty_mask()
+        capture_seqs = []
+        for tool, pieces in self.tool_masks():
+            for sq in iter_squares(jumpers_mask(pieces, TOOL_DIRECTIONS[tool], op_mask, empty)):
+                origin = SQUARE_LOCS[sq]
+                for target_sq, _, jumped_locs in self.iter_capture_sequences(sq, tool):
+                    capture_seqs.append(GameMove(tool, origin, SQUARE_LOCS[target_sq], jumped_locs))
+        if capture_seqs:
             return capture_seqs
 
         # There were no capture moves. We return the single moves.
         return self.calc_single_moves()
 
+    def iter_moves(self, hash_move=None):
+        """Generating the possible moves lazily, in stages: the hash move first (if it is legal here), then the
+        capture sequences origin by origin, then - only if there are no captures - the single moves.
+        No work is done for the stages the caller does not iterate to.
+        The state may be changed between two steps of the iteration, as long as it is restored (e.g. by
+        unmake_move) before the next one.
+
+        :param hash_move: A move to yield first, e.g. the best move a transposition table remembers for
+            this state. It is checked with is_legal_move and skipped if illegal.
+        :return: A generator of GameMove objects, the same moves get_possible_moves returns.
+        """
+        if hash_move is not None:
+            if self.is_legal_move(hash_move):
+                yield hash_move
+            else:
+                hash_move = None
+
+        _, op_mask = self.player_masks()
+        empty = self.empty_mask()
+        tool_masks = self.tool_masks()
+        has_captures = False
+        for tool, pieces in tool_masks:
+            for sq in iter_squares(jumpers_mask(pieces, TOOL_DIRECTIONS[tool], op_mask, empty)):
+                has_captures = True
+                origin = SQUARE_LOCS[sq]
+                for target_sq, _, jumped_locs in self.iter_capture_sequences(sq, tool):
+                    move = GameMove(tool, origin, SQUARE_LOCS[target_sq], jumped_locs)
+                    if move != hash_move:
+                        yield move
+        if has_captures:
+            return
+
+        for tool, pieces in tool_masks:
+            steps = TOOL_STEPS[tool]
+            for sq in iter_squares(movers_mask(pieces, TOOL_DIRECTIONS[tool], empty)):
+                origin = SQUARE_LOCS[sq]
+                for target_bit, target_loc in steps[sq]:
+                    if target_bit & empty:
+                        move = GameMove(tool, origin, target_loc)
+                        if move != hash_move:
+                            yield move
+
+    def has_legal_move(self):
+        """Checking whether the current player has any move, without generating the moves.
+        Uses only mask operations, and returns as soon as one kind of tool is found to have a move.
+        """
+        _, op_mask = self.player_masks()
+        empty = self.empty_mask()
+        for tool, pieces in self.tool_masks():
+            directions = TOOL_DIRECTIONS[tool]
+            if movers_mask(pieces, directions, empty) or jumpers_mask(pieces, directions, op_mask, empty):
+                return True
+        return False
+
+    def has_captures(self):
+        """Checking whether the current player has a capture, and so must capture.
+        """
+        _, op_mask = self.player_masks()
+        empty = self.empty_mask()
+        return any(jumpers_mask(pieces, TOOL_DIRECTIONS[tool], op_mask, empty)
+                   for tool, pieces in self.tool_masks())
+
+    def is_legal_move(self, move):
+        """Checking whether a move, possibly generated for another state, can be performed in this state.
+        A capture sequence must follow legal jumps and be complete.
+        """
+        my_mask, op_mask = self.player_masks()
+        origin_bit = LOC_BITS.get(move.origin_loc, 0)
+        if not my_mask & origin_bit:
+            return False
+        tool = KING_COLOR[self.curr_player] if self.king_mask & origin_bit else PAWN_COLOR[self.curr_player]
+        if move.player_type != tool:
+            return False
+        empty = self.empty_mask()
+        sq = origin_bit.bit_length() - 1
+
+        if not move.jumped_locs:
+            # Captures are forced, so a single move is legal only if there are none.
+            return (not self.has_captures()
+                    and any(target_loc == move.target_loc and target_bit & empty
+                            for target_bit, target_loc in TOOL_STEPS[tool][sq]))
+
+        # Following the capture sequence jump by jump.
+        free_mask = empty | origin_bit
+        jumped_mask = 0
+        for loc in move.jumped_locs:
+            for jumped_bit, land_bit, land_sq, jumped_loc in TOOL_JUMPS[tool][sq]:
+                if jumped_loc == loc:
+                    break
+            else:
+                return False
+            if not (jumped_bit & op_mask and land_bit & free_mask and not jumped_bit & jumped_mask):
+                return False
+            jumped_mask |= jumped_bit
+            sq = land_sq
+        if SQUARE_LOCS[sq] != move.target_loc:
+            return False
+        # The sequence must be complete: no more jumps from its final square.
+        return not any(jumped_bit & op_mask and land_bit & free_mask and not jumped_bit & jumped_mask
+                       for jumped_bit, land_bit, _, _ in TOOL_JUMPS[tool][sq])
+
     def perform_move(self, move):
-        self.board[move.origin_loc] = EM
-        if (move.player_type == PAWN_COLOR[self.curr_player]
-            and move.target_loc[0] == BACK_ROW[self.curr_player]):
-            # If moved pawn to back row, turn to king and put in target
-            self.board[move.target_loc] = KING_COLOR[self.curr_player]
+        """Performs the move on this state, in place.
+        :return: An undo token. Passing it with the move to unmake_move restores the state exactly.
+        """
+        undo_token = (self.red_mask, self.black_mask, self.king_mask, self.turns_since_last_jump,
+                      self.zobrist_key, self.piece_counts, self.row_sums, self.king_centrality)
+        origin_bit = LOC_BITS[move.origin_loc]
+        target_bit = LOC_BITS[move.target_loc]
+        key = self.zobrist_key ^ BLACK_TURN_KEY ^ TOOL_LOC_KEYS[move.player_type][move.origin_loc]
+        king = KING_COLOR[self.curr_player]
+
+        # The features dicts are copied before they change, the undo token keeps the old ones.
+        row_sums = self.row_sums.copy()
+        row_sums[self.curr_player] += move.target_loc[0] - move.origin_loc[0]
+        if move.jumped_locs or move.player_type == king or target_bit & PROMOTION_MASK[self.curr_player]:
+            piece_counts = self.piece_counts.copy()
+            king_centrality = self.king_centrality.copy()
         else:
-            # Move tool to target
-            self.board[move.target_loc] = move.player_type
-        
-        for loc in move.jumped_locs:
-            self.board[loc] = EM
-        if len(move.jumped_locs) > 0:
+            piece_counts = self.piece_counts
+            king_centrality = self.king_centrality
+
+        jumped_mask = 0
+        if move.jumped_locs:
+            opponent = OPPONENT_COLOR[self.curr_player]
+            for loc in move.jumped_locs:
+                jumped_bit = LOC_BITS[loc]
+                jumped_mask |= jumped_bit
+                row_sums[opponent] -= loc[0]
+                if self.king_mask & jumped_bit:
+                    jumped_tool = KING_COLOR[opponent]
+                    king_centrality[opponent] -= LOC_CENTRALITY[loc]
+                else:
+                    jumped_tool = PAWN_COLOR[opponent]
+                piece_counts[jumped_tool] -= 1
+                key ^= TOOL_LOC_KEYS[jumped_tool][loc]
+
+        # Move tool to target. origin and target are the same square when a king jumps in a circle.
+        if self.curr_player == RED_PLAYER:
+            self.red_mask = (self.red_mask & ~origin_bit) | target_bit
+            self.black_mask &= ~jumped_mask
+        else:
+            self.black_mask = (self.black_mask & ~origin_bit) | target_bit
+            self.red_mask &= ~jumped_mask
+        self.king_mask &= ~(origin_bit | jumped_mask)
+        if move.player_type == king:
+            # Kings stay kings.
+            self.king_mask |= target_bit
+            key ^= TOOL_LOC_KEYS[king][move.target_loc]
+            king_centrality[self.curr_player] += LOC_CENTRALITY[move.target_loc] - LOC_CENTRALITY[move.origin_loc]
+        elif target_bit & PROMOTION_MASK[self.curr_player]:
+            # A pawn moved to the back row turns to king.
+            self.king_mask |= target_bit
+            key ^= TOOL_LOC_KEYS[king][move.target_loc]
+            piece_counts[move.player_type] -= 1
+            piece_counts[king] += 1
+            king_centrality[self.curr_player] += LOC_CENTRALITY[move.target_loc]
+        else:
+            key ^= TOOL_LOC_KEYS[move.player_type][move.target_loc]
+        self.zobrist_key = key
+        self.piece_counts = piece_counts
+        self.row_sums = row_sums
+        self.king_centrality = king_centrality
+
+        if jumped_mask:
             self.turns_since_last_jump = 0
         else:
             self.turns_since_last_jump += 0.5        
         
         # Updating the current player.
         self.curr_player = OPPONENT_COLOR[self.curr_player]
-        
+        if self.verify_zobrist:
+            assert self.zobrist_key == self.calc_zobrist_key(), 'Incremental Zobrist key is wrong after ' + str(move)
+        if self.verify_features:
+            piece_counts, row_sums, king_centrality = self.calc_features()
+            assert (piece_counts == self.piece_counts and row_sums == self.row_sums
+                    and all(abs(king_centrality[p] - self.king_centrality[p]) < 1e-9 for p in king_centrality)), \
+                'Incremental evaluation features are wrong after ' + str(move)
+        return undo_token
+
+    def unmake_move(self, move, undo_token):
+        """Takes back a move made by perform_move, restoring the tools, kings, current player,
+        the turns since last jump, the Zobrist key and the evaluation features.
+        :param move: The move that was performed.
+        :param undo_token: The token perform_move returned for it.
+        """
+        (self.red_mask, self.black_mask, self.king_mask, self.turns_since_last_jump,
+         self.zobrist_key, self.piece_counts, self.row_sums, self.king_centrality) = undo_token
+        self.curr_player = OPPONENT_COLOR[self.curr_player]
+
     def draw_board(self):
+        board = self.board
         print("  " + " ".join([str(i) for i in range(BOARD_COLS)]))
         line_sep = " +" + "-+"*BOARD_COLS
         print(line_sep)
         for i in range(BOARD_ROWS):
-            print(str(i) + "|" + "|".join([self.board[(i,j)]
+            print(str(i) + "|" + "|".join([board[(i,j)]
                                            for j in range(BOARD_COLS)]) + "|")
             print(line_sep)
         print("\n" + self.curr_player + " Player Turn!\n\n")
 
+    def __copy__(self):
+        new_state = GameState.__new__(GameState)
+        new_state.__dict__.update(self.__dict__)
+        return new_state
+
+    def __deepcopy__(self, memo):
+        # All the attributes are immutable, so a shallow copy is a deep copy.
+        return self.__copy__()
+
     def __hash__(self):
         """This object can be inserted into a set or as dict key. NOTICE: Changing the object after it has been inserted
         into a set or dict (as key) may have unpredicted results!!!
         """
-        return hash(','.join([self.board[(i,j)]
-                              for i in range(BOARD_ROWS)
-                              for j in range(BOARD_COLS)] + [self.curr_player]))
+        return self.zobrist_key
 
     def __eq__(self, other):
-        return isinstance(other, GameState) and self.board == other.board and self.curr_player == other.curr_player
+        if not isinstance(other, GameState):
+            return False
+        if not self.verify_zobrist:
+            return self.zobrist_key == other.zobrist_key
+
+        same_position = (self.red_mask == other.red_mask
+                         and self.black_mask == other.black_mask
+                         and self.king_mask == other.king_mask
+                         and self.curr_player == other.curr_player)
+        if self.zobrist_key == other.zobrist_key and not same_position:
+            GameState.hash_collisions += 1
+        return same_position
+
+
+def _state_from_bytes(data):
+    """Unpickles a GameState (see GameState.__reduce__)."""
+    return GameState.from_bytes(data)
+
 
+EMPTY_BOARD = {(i,j) : EM
+               for j in range(BOARD_COLS)
+               for i in range(BOARD_ROWS)}
@@ -0,0 +1,124 @@
+"""
+This file holds the opening book: for positions of the first plies of the game, the moves deep
+searches found best, with weights.
+The book file is a sorted array of fixed size records (Zobrist key, packed move, weight), so it
+is probed by a binary search over the memory mapped file. A position with several book moves has
+a record per move, next to each other.
+"""
+
+#===============================================================================
+# Imports
+#===============================================================================
+
+import os
+import mmap
+import random
+import struct
+from .bitboard import pack_move, unpack_move
+
+#===============================================================================
+# Globals
+#===============================================================================
+
+BOOK_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'opening_book.bin')
+
+# A record: the Zobrist key of the position, the move (see bitboard.pack_move) and its weight.
+BOOK_RECORD = struct.Struct('<QQI')
+
+# The weight of the best move of a position. The other moves in the book get less.
+BOOK_WEIGHT_SCALE = 1000
+
+#===============================================================================
+# Writing
+#===============================================================================
+
+def write_book(entries, file_name=BOOK_FILE):
+    """Writes an opening book.
+    :param entries: A dict from the Zobrist key of a position to a list of (move, weight).
+    """
+    with open(file_name, 'wb') as f:
+        for key in sorted(entries):
+            for move, weight in sorted(entries[key], key=lambda entry: -entry[1]):
+                f.write(BOOK_RECORD.pack(key, pack_move(move), weight))
+
+#===============================================================================
+# Probing
+#===============================================================================
+
+class OpeningBook:
+
+    def __init__(self, file_name=BOOK_FILE, seed=None):
+        """Opens an opening book. A missing (or empty) file, or None, is an empty book.
+        :param seed: The seed of the random choice between the moves of a position.
+        """
+        self.file_name = file_name
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.data = None
+        self.record_count = 0
+        if file_name is not None and os.path.isfile(file_name) and os.path.getsize(file_name):
+            with open(file_name, 'rb') as f:
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.record_count = len(self.data) // BOOK_RECORD.size
+        self.hits = 0
+
+    def _key_at(self, i):
+        return BOOK_RECORD.unpack_from(self.data, i * BOOK_RECORD.size)[0]
+
+    def probe(self, key):
+        """Looks up a position.
+        :param key: The Zobrist key of the position.
+        :return: A list of (move, weight), the heaviest first. Empty if the position is not in the book.
+        """
+        # Binary search for the first record of the key.
+        low, high = 0, self.record_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        entries = []
+        for i in range(low, self.record_count):
+            record_key, packed_move, weight = BOOK_RECORD.unpack_from(self.data, i * BOOK_RECORD.size)
+            if record_key != key:
+                break
+            entries.append((unpack_move(packed_move), weight))
+        return entries
+
+    def choose_move(self, state):
+        """Chooses one of the book moves of a state, at random by their weights.
+        :return: The move, or None if the state is not in the book.
+        """
+        # A different position with the same key could be in the book, so the moves are checked.
+        entries = [(move, weight) for move, weight in self.probe(state.zobrist_key) if state.is_legal_move(move)]
+        if not entries:
+            return None
+        self.hits += 1
+        choice = self.rng.uniform(0, sum(weight for _, weight in entries))
+        for move, weight in entries:
+            choice -= weight
+            if choice <= 0:
+                break
+        return move
+
+    def set_seed(self, seed):
+        """Restarts the random choice between the moves of a position from a seed."""
+        self.seed = seed
+        self.rng.seed(seed)
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+        self.data = None
+        self.record_count = 0
+
+    def __len__(self):
+        return self.record_count
+
+    def __getstate__(self):
+        # Other processes open the same file.
+        return {'file_name': self.file_name, 'seed': self.seed}
+
+    def __setstate__(self, state):
+        self.__init__(state['file_name'], state['seed'])
@@ -22,6 +22,9 @@ BOARD_ROWS = BOARD_COLS = 8
 
 IS_BLACK_TILE = lambda loc: (loc[0] + loc[1]) % 2 == 0
 
+CENTER_BOARD = 3.5  # the middle of 0 and 7
+MAX_DISTANCE_FROM_CENTER = 4.95  # the distance from (0, 0) to (3.5, 3.5)
+
 # Assigning colors per tool and player type
 PAWN_COLOR = {
     RED_PLAYER: RP,
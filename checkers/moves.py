@@ -38,11 +38,49 @@ class GameMove:
             s += ", eat: " + ",".join([str(loc) for loc in self.jumped_locs])
         
         return s
+
+    def __eq__(self, other):
+        """Moves are equal when they move the same tool along the same path, even if they were
+        generated separately (e.g. a best move remembered from an earlier search).
+        """
+        return (isinstance(other, GameMove)
+                and self.origin_loc == other.origin_loc
+                and self.target_loc == other.target_loc
+                and self.player_type == other.player_type
+                and self.jumped_locs == other.jumped_locs)
+
+    def __hash__(self):
+        return hash((self.origin_loc, self.target_loc, tuple(self.jumped_locs)))
+
+    def to_bytes(self):
+        """Packs the move into PACKED_MOVE_BYTES bytes, see bitboard.pack_move."""
+        from .bitboard import pack_move
+        return pack_move(self).to_bytes(PACKED_MOVE_BYTES, 'little')
+
+    @staticmethod
+    def from_bytes(data):
+        """Unpacks a move packed by to_bytes.
+        :return: A GameMove, or None if data packs no move.
+        """
+        from .bitboard import unpack_move
+        return unpack_move(int.from_bytes(data, 'little'))
+
+    def __reduce__(self):
+        # Pickled (e.g. to other processes) as the int of bitboard.pack_move. A move that is not a legal path
+        # on the board (it was not generated by GameState) cannot be packed, and is pickled as it is.
+        from .bitboard import pack_move, unpack_move
+        try:
+            return unpack_move, (pack_move(self),)
+        except (KeyError, ValueError):
+            return GameMove, (self.player_type, self.origin_loc, self.target_loc, self.jumped_locs)
         
 #===============================================================================
 # Move Constants
 #===============================================================================
 
+# The number of bytes of a packed move (see GameMove.to_bytes): bitboard.PACKED_MOVE_BITS, rounded up.
+PACKED_MOVE_BYTES = 5
+
 # Directions:
 # Down: row += 1
 # Up: row -= 1
@@ -0,0 +1,339 @@
+"""
+This file holds the endgame tablebases: every position with up to a few tools on the board, solved
+by retrograde analysis, written to disk and probed through mmap.
+
+The positions are split into slices by the number of red and of black tools. A slice holds the
+positions with red to move only; a position with black to move is probed as the same position
+turned around (rotated by 180 degrees, with the colors swapped).
+Each position is a byte: 0 for a draw, and otherwise its result for the player to move (WIN or
+LOSS) and its distance: the number of plies left before a jump, until which the result holds.
+The result only holds while the MAX_TURNS_NO_JUMP draw rule leaves at least that many plies,
+since the winner may need them all to make progress. Jumps reset the count, so a position with
+a forced jump has distance 1.
+"""
+
+#===============================================================================
+# Imports
+#===============================================================================
+
+import os
+import mmap
+from array import array
+from itertools import combinations
+from .consts import RED_PLAYER, BLACK_PLAYER, MAX_TURNS_NO_JUMP
+from .bitboard import NUM_SQUARES, PROMOTION_MASK, iter_squares
+from .board import GameState
+
+#===============================================================================
+# Globals
+#===============================================================================
+
+TABLEBASE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tablebases')
+DEFAULT_MAX_PIECES = 3
+
+# Results, for the player to move.
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+# The number of plies without a jump that ends the game in a tie.
+MAX_PLIES_NO_JUMP = int(2 * MAX_TURNS_NO_JUMP)
+
+# A stored byte is the distance of a WIN, or LOSS_FLAG plus the distance of a LOSS.
+LOSS_FLAG = 128
+
+# COMBINATIONS[n][k] is n choose k.
+COMBINATIONS = [[0] * (NUM_SQUARES + 1) for _ in range(NUM_SQUARES + 1)]
+for _n in range(NUM_SQUARES + 1):
+    COMBINATIONS[_n][0] = 1
+    for _k in range(1, _n + 1):
+        COMBINATIONS[_n][_k] = COMBINATIONS[_n - 1][_k - 1] + COMBINATIONS[_n - 1][_k]
+
+_REVERSED_BYTES = [int('{:08b}'.format(i)[::-1], 2) for i in range(256)]
+
+#===============================================================================
+# Indexing
+#===============================================================================
+
+def reverse_mask(mask):
+    """Turns a mask around: square sq goes to square NUM_SQUARES - 1 - sq, which is the board
+    rotated by 180 degrees.
+    """
+    return (_REVERSED_BYTES[mask & 0xff] << 24 | _REVERSED_BYTES[(mask >> 8) & 0xff] << 16 |
+            _REVERSED_BYTES[(mask >> 16) & 0xff] << 8 | _REVERSED_BYTES[mask >> 24])
+
+def count_tools(mask):
+    return bin(mask).count('1')
+
+def slice_file_name(red_count, black_count):
+    return '{}v{}.tb'.format(red_count, black_count)
+
+def slice_size(red_count, black_count):
+    """The number of positions in the slice: the red squares, the black squares out of the rest,
+    and which of the tools are kings.
+    """
+    return (COMBINATIONS[NUM_SQUARES][red_count] * COMBINATIONS[NUM_SQUARES - red_count][black_count]
+            << (red_count + black_count))
+
+def position_index(red_mask, black_mask, king_mask):
+    """The perfect hash of a position with red to move: its index in its slice.
+    The squares of each color are ranked in the combinatorial number system, the black ones
+    counting only the squares red does not stand on, followed by a bit per tool for kings.
+    """
+    red_count = black_count = 0
+    red_rank = black_rank = 0
+    king_bits = 0
+    for sq in iter_squares(red_mask):
+        red_count += 1
+        red_rank += COMBINATIONS[sq][red_count]
+        if king_mask >> sq & 1:
+            king_bits |= 1 << (red_count - 1)
+    for sq in iter_squares(black_mask):
+        black_count += 1
+        black_rank += COMBINATIONS[sq - count_tools(red_mask & ((1 << sq) - 1))][black_count]
+        if king_mask >> sq & 1:
+            king_bits |= 1 << (red_count + black_count - 1)
+    return (((red_rank * COMBINATIONS[NUM_SQUARES - red_count][black_count] + black_rank)
+             << (red_count + black_count)) | king_bits)
+
+def iter_slice_positions(red_count, black_count):
+    """Yields every placement of the tools of a slice, including illegal ones (pawns on the row
+    they are promoted on).
+    :return: Yields (index, red mask, black mask, king mask) tuples.
+    """
+    for red_squares in combinations(range(NUM_SQUARES), red_count):
+        red_mask = sum(1 << sq for sq in red_squares)
+        free_squares = [sq for sq in range(NUM_SQUARES) if not red_mask >> sq & 1]
+        for black_squares in combinations(free_squares, black_count):
+            black_mask = sum(1 << sq for sq in black_squares)
+            tool_squares = red_squares + black_squares
+            for kings in range(1 << (red_count + black_count)):
+                king_mask = sum(1 << sq for i, sq in enumerate(tool_squares) if kings >> i & 1)
+                yield position_index(red_mask, black_mask, king_mask), red_mask, black_mask, king_mask
+
+def encode_result(result, distance):
+    if result == WIN:
+        return distance
+    if result == LOSS:
+        return LOSS_FLAG + distance
+    return 0
+
+def decode_result(stored, plies_left):
+    """:return: A tuple: (The result for the player to move, with plies_left plies to a tie, The distance)"""
+    if not stored:
+        return DRAW, 0
+    if stored < LOSS_FLAG:
+        return (WIN, stored) if stored <= plies_left else (DRAW, 0)
+    return (LOSS, stored - LOSS_FLAG) if stored - LOSS_FLAG <= plies_left else (DRAW, 0)
+
+#===============================================================================
+# Probing
+#===============================================================================
+
+class EndgameTablebase:
+
+    def __init__(self, directory=TABLEBASE_DIR):
+        """Opens the tablebase files found in directory. Missing files are fine: positions with
+        more tools than max_pieces, where some slice is missing, are simply not found.
+        """
+        self.directory = directory
+        self.tables = {}
+        if os.path.isdir(directory):
+            for file_name in os.listdir(directory):
+                red_count, _, black_count = file_name[:-len('.tb')].partition('v')
+                if not file_name.endswith('.tb') or not red_count.isdigit() or not black_count.isdigit():
+                    continue
+                with open(os.path.join(directory, file_name), 'rb') as f:
+                    self.tables[(int(red_count), int(black_count))] = mmap.mmap(f.fileno(), 0,
+                                                                               access=mmap.ACCESS_READ)
+        # The most tools for which every slice is there.
+        self.max_pieces = 0
+        if self.tables:
+            self.max_pieces = 1
+            while all((red_count, self.max_pieces + 1 - red_count) in self.tables
+                      for red_count in range(1, self.max_pieces + 1)):
+                self.max_pieces += 1
+        self.probes = 0
+        self.hits = 0
+
+    def probe(self, red_mask, black_mask, king_mask, curr_player, turns_since_last_jump):
+        """Looks up a position.
+        :return: A tuple: (WIN, LOSS or DRAW for the player to move, The distance), or None if the
+        position is not in the tablebase.
+        """
+        if not (red_mask if curr_player == RED_PLAYER else black_mask):
+            # The player to move has no tools, so no moves.
+            return LOSS, 1
+        if count_tools(red_mask | black_mask) > self.max_pieces:
+            return None
+        self.probes += 1
+        if curr_player == BLACK_PLAYER:
+            red_mask, black_mask, king_mask = reverse_mask(black_mask), reverse_mask(red_mask), reverse_mask(king_mask)
+        table = self.tables.get((count_tools(red_mask), count_tools(black_mask)))
+        if table is None:
+            return None
+        self.hits += 1
+        plies_left = MAX_PLIES_NO_JUMP - int(round(2 * turns_since_last_jump))
+        return decode_result(table[position_index(red_mask, black_mask, king_mask)], plies_left)
+
+    def probe_state(self, state):
+        """Looks up a GameState. See probe."""
+        return self.probe(state.red_mask, state.black_mask, state.king_mask, state.curr_player,
+                          state.turns_since_last_jump)
+
+    def best_move(self, state):
+        """Picks the move that keeps the result of the state for the player to move: the fastest
+        win, the slowest loss, or any move that keeps the draw.
+        :return: A tuple: (The result, The move), or None if the state is not in the tablebase.
+        """
+        probe = self.probe_state(state)
+        if probe is None:
+            return None
+        best_key, best_move = None, None
+        for move in state.get_possible_moves():
+            undo_token = state.perform_move(move)
+            child_result, child_distance = self.probe_state(state)
+            state.unmake_move(move, undo_token)
+            if move.jumped_locs:
+                # A jump resets the count of plies, so it is the fastest way to make progress.
+                child_distance = 0
+            key = (-child_result, -child_distance if child_result == LOSS else child_distance)
+            if best_key is None or key > best_key:
+                best_key, best_move = key, move
+        return probe[0], best_move
+
+    def close(self):
+        for table in self.tables.values():
+            table.close()
+        self.tables = {}
+        self.max_pieces = 0
+
+    def __getstate__(self):
+        # Other processes open the same files.
+        return {'directory': self.directory}
+
+    def __setstate__(self, state):
+        self.__init__(state['directory'])
+
+#===============================================================================
+# Generation
+#===============================================================================
+
+def solve_slices(slices, tablebase):
+    """Solves slices that depend on each other by retrograde analysis: a slice with red to move
+    leads, by a move without a jump, to the slice with the counts swapped.
+    The slices with fewer tools must be in the tablebase already, for the positions after jumps.
+    :param slices: A list of (red count, black count) slices.
+    :return: A dict from slice to the bytearray of its positions.
+    """
+    offsets = {}
+    total_size = 0
+    for red_count, black_count in slices:
+        offsets[(red_count, black_count)] = total_size
+        total_size += slice_size(red_count, black_count)
+
+    results = bytearray(total_size)
+    # Positions without jumps: the number of their moves not known to win for the opponent yet,
+    # and their moves, as (position, next position) edges.
+    open_moves = array('H', bytes(2 * total_size))
+    edge_parents = array('I')
+    edge_children = array('I')
+    frontier = []
+    illegal_pawns = {RED_PLAYER: PROMOTION_MASK[RED_PLAYER], BLACK_PLAYER: PROMOTION_MASK[BLACK_PLAYER]}
+
+    for red_count, black_count in slices:
+        offset = offsets[(red_count, black_count)]
+        child_offset = offsets[(black_count, red_count)]
+        for index, red_mask, black_mask, king_mask in iter_slice_positions(red_count, black_count):
+            if (red_mask & ~king_mask & illegal_pawns[RED_PLAYER] or
+                    black_mask & ~king_mask & illegal_pawns[BLACK_PLAYER]):
+                continue
+            position = offset + index
+            state = GameState.from_masks(red_mask, black_mask, king_mask, RED_PLAYER)
+            moves = state.get_possible_moves()
+            if not moves:
+                results[position] = encode_result(LOSS, 1)
+                frontier.append(position)
+                continue
+            if moves[0].jumped_locs:
+                # Jumps are forced, so these are all jumps, to positions with fewer tools.
+                result = LOSS
+                for move in moves:
+                    undo_token = state.perform_move(move)
+                    result = max(result, -tablebase.probe_state(state)[0])
+                    state.unmake_move(move, undo_token)
+                if result != DRAW:
+                    results[position] = encode_result(result, 1)
+                    frontier.append(position)
+                continue
+            for move in moves:
+                undo_token = state.perform_move(move)
+                edge_parents.append(position)
+                edge_children.append(child_offset + position_index(reverse_mask(state.black_mask),
+                                                                   reverse_mask(state.red_mask),
+                                                                   reverse_mask(state.king_mask)))
+                state.unmake_move(move, undo_token)
+            open_moves[position] = len(moves)
+
+    # The positions each position is reached from, grouped by position.
+    parents_start = array('I', bytes(4 * (total_size + 1)))
+    for child in edge_children:
+        parents_start[child + 1] += 1
+    for position in range(total_size):
+        parents_start[position + 1] += parents_start[position]
+    parents = array('I', bytes(4 * len(edge_children)))
+    fill = parents_start[:-1]
+    for parent, child in zip(edge_parents, edge_children):
+        parents[fill[child]] = parent
+        fill[child] += 1
+    del edge_parents, edge_children, fill
+
+    # Going back from the decided positions, one ply at a time. A position is won as soon as one of its
+    # moves leads to a lost position, and lost once all of them lead to won positions.
+    distance = 1
+    while frontier and distance < MAX_PLIES_NO_JUMP:
+        next_frontier = []
+        for child in frontier:
+            child_lost = results[child] > LOSS_FLAG
+            for i in range(parents_start[child], parents_start[child + 1]):
+                parent = parents[i]
+                if results[parent]:
+                    continue
+                if child_lost:
+                    results[parent] = encode_result(WIN, distance + 1)
+                    next_frontier.append(parent)
+                else:
+                    open_moves[parent] -= 1
+                    if not open_moves[parent]:
+                        results[parent] = encode_result(LOSS, distance + 1)
+                        next_frontier.append(parent)
+        frontier = next_frontier
+        distance += 1
+
+    return {(red_count, black_count): results[offset:offset + slice_size(red_count, black_count)]
+            for (red_count, black_count), offset in offsets.items()}
+
+def generate_tablebases(max_pieces=DEFAULT_MAX_PIECES, directory=TABLEBASE_DIR, progress=None):
+    """Generates the tablebases of all the positions with up to max_pieces tools, from the
+    fewest tools up. Slices already in directory are kept, so a larger tablebase can be built
+    on top of a smaller one.
+    :param progress: An optional function called with each slice written, and the number of its
+        positions decided (not drawn).
+    :return: An EndgameTablebase of the directory.
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    tablebase = EndgameTablebase(directory)
+    for total in range(2, max_pieces + 1):
+        for red_count in range(total - 1, (total - 1) // 2, -1):
+            slices = sorted({(red_count, total - red_count), (total - red_count, red_count)})
+            if all(s in tablebase.tables for s in slices):
+                continue
+            for (slice_red, slice_black), results in solve_slices(slices, tablebase).items():
+                with open(os.path.join(directory, slice_file_name(slice_red, slice_black)), 'wb') as f:
+                    f.write(results)
+                if progress is not None:
+                    progress((slice_red, slice_black), len(results) - results.count(0))
+        tablebase.close()
+        tablebase = EndgameTablebase(directory)
+    return tablebase
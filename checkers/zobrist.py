@@ -0,0 +1,70 @@
+"""
+This file holds the Zobrist keys used to hash game states.
+A state's key is the XOR of a random 64-bit key per (tool, square) on the board, and of
+BLACK_TURN_KEY when black is to move, so it can be updated as moves are performed.
+"""
+
+#===============================================================================
+# Imports
+#===============================================================================
+
+import random
+from .consts import RED_PLAYER, BLACK_PLAYER, RP, RK, BP, BK, MAX_TURNS_NO_JUMP
+from .bitboard import SQUARE_LOCS, iter_squares
+
+#===============================================================================
+# Keys
+#===============================================================================
+
+# A fixed seed, so keys (and anything stored by key) are the same in every run.
+ZOBRIST_SEED = 20201120
+
+_rng = random.Random(ZOBRIST_SEED)
+
+# TOOL_SQUARE_KEYS[tool][square] is the key of that tool standing on that square.
+TOOL_SQUARE_KEYS = {tool : [_rng.getrandbits(64) for _ in SQUARE_LOCS]
+                    for tool in (RP, RK, BP, BK)}
+
+# Same keys, by location (2-tuple) instead of by square index.
+TOOL_LOC_KEYS = {tool : dict(zip(SQUARE_LOCS, keys))
+                 for tool, keys in TOOL_SQUARE_KEYS.items()}
+
+BLACK_TURN_KEY = _rng.getrandbits(64)
+
+# PLIES_NO_JUMP_KEYS[plies] is the key of the number of plies since the last jump, up to the limit of
+# MAX_TURNS_NO_JUMP turns. It is not part of a state's key (see plies_zobrist_key).
+MAX_PLIES_NO_JUMP = int(2 * MAX_TURNS_NO_JUMP)
+PLIES_NO_JUMP_KEYS = [_rng.getrandbits(64) for _ in range(MAX_PLIES_NO_JUMP + 1)]
+
+# The key to XOR in when the given player is the one to move.
+TURN_KEYS = {
+    RED_PLAYER: 0,
+    BLACK_PLAYER: BLACK_TURN_KEY,
+}
+
+#===============================================================================
+# Functions
+#===============================================================================
+
+def calc_zobrist_key(red_mask, black_mask, king_mask, curr_player):
+    """Calculates the key of a position from scratch.
+    :return: The 64-bit Zobrist key.
+    """
+    key = TURN_KEYS[curr_player]
+    for tool, mask in ((RP, red_mask & ~king_mask),
+                       (RK, red_mask & king_mask),
+                       (BP, black_mask & ~king_mask),
+                       (BK, black_mask & king_mask)):
+        keys = TOOL_SQUARE_KEYS[tool]
+        for sq in iter_squares(mask):
+            key ^= keys[sq]
+    return key
+
+
+def plies_zobrist_key(zobrist_key, turns_since_last_jump):
+    """Folds the plies since the last jump into a key, for what depends on them: the values of a search,
+    which are draws at the limit of turns without a jump, and the tablebase results that hold only while the
+    limit leaves enough plies.
+    :return: The 64-bit key.
+    """
+    return zobrist_key ^ PLIES_NO_JUMP_KEYS[min(int(round(2 * turns_since_last_jump)), MAX_PLIES_NO_JUMP)]
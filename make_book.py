@@ -0,0 +1,103 @@
+"""
+Builds the opening book the players consult (see checkers/book.py).
+Starting from the initial position, every position of the first plies is searched deeply, one
+root move at a time. The moves within a margin of the best one go into the book, weighted by how
+close they are to it, and the positions after them are searched in turn.
+The utility of the given player is used for the searches, from the side of the player to move.
+"""
+import sys
+import time
+import copy
+from checkers.board import GameState
+from checkers.book import write_book, BOOK_FILE, BOOK_WEIGHT_SCALE
+from checkers.consts import RED_PLAYER, BLACK_PLAYER
+from utils import MiniMaxWithAlphaBetaPruning, TranspositionTable, MoveOrdering, INFINITY
+
+DEFAULT_BOOK_PLIES = 6
+DEFAULT_BOOK_DEPTH = 6
+# How much worse than the best move a move may be and still go into the book.
+DEFAULT_BOOK_MARGIN = 0.25
+
+
+def book_weight(value, best_value, margin):
+    """:return: The weight of a move: BOOK_WEIGHT_SCALE for the best one, down to 1 at the margin."""
+    if not margin:
+        return BOOK_WEIGHT_SCALE
+    return max(1, int(round(BOOK_WEIGHT_SCALE * (1 - (best_value - value) / margin))))
+
+
+def build_book(player_module, plies=DEFAULT_BOOK_PLIES, depth=DEFAULT_BOOK_DEPTH, margin=DEFAULT_BOOK_MARGIN,
+               progress=None):
+    """Searches the positions of the first plies of the game.
+
+    :param player_module: The module of the player whose utility is used, e.g. players.better_h_player.
+    :param plies: The number of plies the book covers.
+    :param depth: The depth of the search of each root move.
+    :param margin: How much worse than the best move a move may be and still go into the book.
+    :param progress: An optional function called with each position searched and its book moves.
+    :return: A dict from the Zobrist key of a position to a list of (move, weight), for write_book.
+    """
+    searchers = {}
+    for color in (RED_PLAYER, BLACK_PLAYER):
+        player = player_module.Player(INFINITY, color, INFINITY, 1)
+        # Only the player's utility is used: its own search thread (and processes) are not needed.
+        player.close()
+        searchers[color] = MiniMaxWithAlphaBetaPruning(player.utility, color, lambda: False,
+                                                       player.selective_deepening_criterion,
+                                                       TranspositionTable(), MoveOrdering())
+
+    entries = {}
+    frontier = [GameState()]
+    for _ in range(plies):
+        next_frontier = []
+        for state in frontier:
+            if state.zobrist_key in entries:
+                continue
+            moves = state.get_possible_moves()
+            if not moves:
+                continue
+            searcher = searchers[state.curr_player]
+            values = []
+            for move in moves:
+                undo_token = state.perform_move(move)
+                value, _ = searcher.search(state, depth - 1, -INFINITY, INFINITY, False)
+                state.unmake_move(move, undo_token)
+                values.append(value)
+            best_value = max(values)
+            book_moves = [(move, book_weight(value, best_value, margin))
+                          for move, value in zip(moves, values) if value >= best_value - margin]
+            if len(moves) > 1:
+                # The players do not search a position with a single move anyway.
+                entries[state.zobrist_key] = book_moves
+            if progress is not None:
+                progress(state, book_moves)
+            for move, _ in book_moves:
+                next_state = copy.copy(state)
+                next_state.perform_move(move)
+                next_frontier.append(next_state)
+        frontier = next_frontier
+    return entries
+
+
+if __name__ == '__main__':
+    try:
+        player_name = sys.argv[1] if len(sys.argv) > 1 else 'better_h_player'
+        book_plies = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_BOOK_PLIES
+        book_depth = int(sys.argv[3]) if len(sys.argv) > 3 else DEFAULT_BOOK_DEPTH
+        book_margin = float(sys.argv[4]) if len(sys.argv) > 4 else DEFAULT_BOOK_MARGIN
+        book_file = sys.argv[5] if len(sys.argv) > 5 else BOOK_FILE
+    except ValueError:
+        print("""Syntax: {0} [player] [plies] [depth] [margin] [book_file]
+For example: {0} better_h_player 6 6 0.25""".format(sys.argv[0]))
+        sys.exit(2)
+
+    start = time.time()
+    __import__('players.{}'.format(player_name))
+
+    def report(state, book_moves):
+        print('{:.1f}s: {} book moves: {}'.format(time.time() - start, state.curr_player,
+                                                  ', '.join(str(move) for move, _ in book_moves)))
+
+    book = build_book(sys.modules['players.{}'.format(player_name)], book_plies, book_depth, book_margin, report)
+    write_book(book, book_file)
+    print('{} positions written to {}'.format(len(book), book_file))
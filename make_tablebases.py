@@ -0,0 +1,27 @@
+"""
+Generates the endgame tablebases the players probe (see checkers/tablebase.py): every position
+with up to max_pieces tools, solved by retrograde analysis.
+Slices already generated are kept, so running it again with a larger max_pieces only adds the new ones.
+"""
+import sys
+import time
+from checkers.tablebase import generate_tablebases, DEFAULT_MAX_PIECES, TABLEBASE_DIR
+
+
+if __name__ == '__main__':
+    try:
+        max_pieces = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_MAX_PIECES
+        directory = sys.argv[2] if len(sys.argv) > 2 else TABLEBASE_DIR
+    except ValueError:
+        print("""Syntax: {0} [max_pieces] [directory]
+For example: {0} 3""".format(sys.argv[0]))
+        sys.exit(2)
+
+    start = time.time()
+
+    def report(table_slice, decided):
+        print('{}v{}: {} positions decided ({:.1f}s)'.format(table_slice[0], table_slice[1], decided,
+                                                             time.time() - start))
+
+    tablebase = generate_tablebases(max_pieces, directory, report)
+    print('Tablebases of up to {} tools in {}'.format(tablebase.max_pieces, directory))
@@ -0,0 +1,157 @@
+"""
+Perft: counts the leaf nodes of the move tree of a position to a fixed depth, with perform_move and
+unmake_move, to check the move generator and measure its speed.
+The counts of the start position and of a few stored positions are known (PERFT_REFERENCE_COUNTS), so
+a change to GameState.generate_possible_moves or perform_move that changes them is a bug. The start
+position counts are the published ones of English draughts. The others were counted both by the move
+generator and by the reference moves of check_moves.py.
+Like every perft, it counts the move tree only: the limit of turns without a jump is not applied.
+"""
+import sys
+import time
+from checkers.board import GameState
+from checkers.bitboard import RED_START_MASK, BLACK_START_MASK
+from checkers.consts import RED_PLAYER
+from check_moves import reference_moves
+
+# A position: (red mask, black mask, king mask, player to move, turns since last jump). See bitboard.py.
+PERFT_POSITIONS = {
+    'start': (RED_START_MASK, BLACK_START_MASK, 0, RED_PLAYER, 0),
+    # A midgame with a black king behind the red lines.
+    'mid': (0xd98a, 0xbaf00004, 0x4, RED_PLAYER, 0),
+    # A red king among black pawns, with double jumps.
+    'multi': (0x400202d3, 0x89040400, 0x40000000, RED_PLAYER, 0.5),
+    # Red kings and pawns against a black king.
+    'kings': (0x28201081, 0x200, 0x28000200, RED_PLAYER, 5.5),
+    # Two kings and a pawn against two kings.
+    'end': (0x602000, 0x4010, 0x604010, RED_PLAYER, 0),
+}
+
+# The leaf nodes of every position at depths 1, 2, ...
+PERFT_REFERENCE_COUNTS = {
+    'start': (7, 49, 302, 1469, 7361, 36768, 179740, 845931),
+    'mid': (8, 38, 149, 703, 2840, 13264, 53039, 240515),
+    'multi': (2, 2, 18, 61, 277, 1047, 5388, 22815, 129735),
+    'kings': (12, 19, 170, 402, 3644, 11471, 89989, 246343),
+    'end': (10, 64, 431, 1971, 13661, 73361),
+}
+
+# check_reference_counts skips the depths with more leaf nodes than this.
+PERFT_CHECK_MAX_NODES = 200000
+
+
+def perft_position(name):
+    """:return: A new GameState of a position of PERFT_POSITIONS."""
+    return GameState.from_masks(*PERFT_POSITIONS[name])
+
+
+def generated_moves(state):
+    """The moves of the move generator, without the cache of get_possible_moves."""
+    return state.generate_possible_moves()
+
+
+def perft(state, depth, moves_of=generated_moves):
+    """Counts the leaf nodes of the move tree of a state.
+    The state is changed during the count, and restored.
+
+    :param depth: The depth of the tree, in plies.
+    :param moves_of: The function generating the moves of a state.
+    :return: The number of positions depth plies from the state.
+    """
+    if depth == 0:
+        return 1
+    moves = moves_of(state)
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        undo_token = state.perform_move(move)
+        nodes += perft(state, depth - 1, moves_of)
+        state.unmake_move(move, undo_token)
+    return nodes
+
+
+def divide(state, depth, moves_of=generated_moves):
+    """Counts the leaf nodes under every root move, to find the move whose subtree is wrong when a
+    count is.
+    :return: A list of (move, number of leaf nodes), in generation order.
+    """
+    counts = []
+    for move in moves_of(state):
+        undo_token = state.perform_move(move)
+        counts.append((move, perft(state, depth - 1, moves_of)))
+        state.unmake_move(move, undo_token)
+    return counts
+
+
+def check_reference_counts(max_nodes=PERFT_CHECK_MAX_NODES, moves_of=generated_moves):
+    """Counts the stored positions to every reference depth with up to max_nodes leaf nodes.
+    :return: The total number of leaf nodes counted.
+    :raises AssertionError: On the first count that differs from its reference.
+    """
+    total = 0
+    for name, counts in PERFT_REFERENCE_COUNTS.items():
+        state = perft_position(name)
+        for depth, expected in enumerate(counts, 1):
+            if expected > max_nodes:
+                break
+            nodes = perft(state, depth, moves_of)
+            if nodes != expected:
+                raise AssertionError('perft({}, {}) is {}, expected {}'.format(name, depth, nodes, expected))
+            total += nodes
+    return total
+
+
+def nodes_per_second(nodes, seconds):
+    return nodes / seconds if seconds > 0 else float('inf')
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    moves_of = generated_moves
+    if args and args[-1] == 'reference':
+        moves_of = reference_moves
+        args = args[:-1]
+    try:
+        if args and args[0] == 'check':
+            check_max_nodes = int(args[1]) if len(args) > 1 else PERFT_CHECK_MAX_NODES
+        else:
+            perft_depth = int(args[0])
+            position_name = args[1] if len(args) > 1 else 'start'
+            show_divide = len(args) > 2 and args[2] == 'divide'
+            if perft_depth < 1 or position_name not in PERFT_POSITIONS:
+                raise ValueError(position_name)
+    except (IndexError, ValueError):
+        print("""Syntax: {0} depth [position] [divide] [reference]
+        {0} check [max_nodes] [reference]
+Positions: {1}
+reference counts with the reference moves of check_moves.py instead of the move generator.
+For example: {0} 7 start divide""".format(sys.argv[0], ', '.join(PERFT_POSITIONS)))
+        sys.exit(2)
+
+    start = time.perf_counter()
+    if args[0] == 'check':
+        try:
+            total_nodes = check_reference_counts(check_max_nodes, moves_of)
+        except AssertionError as e:
+            print(e)
+            sys.exit(1)
+        elapsed = time.perf_counter() - start
+        print('All reference counts match: {} nodes in {:.2f}s, {:.0f} nodes/s'.format(
+            total_nodes, elapsed, nodes_per_second(total_nodes, elapsed)))
+    else:
+        state = perft_position(position_name)
+        if show_divide:
+            move_counts = divide(state, perft_depth, moves_of)
+            for move, count in move_counts:
+                print('{}: {}'.format(move, count))
+            total_nodes = sum(count for _, count in move_counts)
+        else:
+            total_nodes = perft(state, perft_depth, moves_of)
+        elapsed = time.perf_counter() - start
+        print('perft({}, {}) = {} nodes in {:.2f}s, {:.0f} nodes/s'.format(
+            position_name, perft_depth, total_nodes, elapsed, nodes_per_second(total_nodes, elapsed)))
+        counts = PERFT_REFERENCE_COUNTS[position_name]
+        if perft_depth <= len(counts) and counts[perft_depth - 1] != total_nodes:
+            print('Expected {} nodes!'.format(counts[perft_depth - 1]))
+            sys.exit(1)
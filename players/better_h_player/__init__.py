@@ -5,10 +5,10 @@
 
 from players import simple_player
 import abstract
-from utils import MiniMaxWithAlphaBetaPruning, INFINITY, run_with_limited_time, ExceededTimeError
-from checkers.consts import BOARD_COLS, BOARD_ROWS, EM, MY_COLORS, PAWN_COLOR, KING_COLOR, OPPONENT_COLOR, MAX_TURNS_NO_JUMP
+from utils import INFINITY
+from checkers.consts import (BOARD_COLS, BOARD_ROWS, PAWN_COLOR, KING_COLOR, OPPONENT_COLOR, MAX_TURNS_NO_JUMP,
+                             CENTER_BOARD, MAX_DISTANCE_FROM_CENTER)
 import time
-from collections import defaultdict
 import math
 # ===============================================================================
 # Globals
@@ -16,8 +16,6 @@ import math
 
 PAWN_WEIGHT = 1
 KING_WEIGHT = 1.5
-CENTER_BOARD = 3.5  # the middle of 0 and 7
-MAX_DISTANCE_FROM_CENTER = 4.95  # the distance from (0, 0) to (3.5, 3.5)
 
 # ===============================================================================
 # Player
@@ -41,8 +39,10 @@ class Player(simple_player.Player):
             # otherwise, we divided the time uniformly.
             self.time_for_current_move = self.time_remaining_in_round / \
                 self.turns_remaining_in_round - 0.05
-        # if there is only one possible move we still have to update the counters!
-        if len(possible_moves) == 1:
+        # if there is only one possible move (or a move from the opening book) we still have to update the
+        # counters! The time it does not spend is left for the next moves of the round.
+        instant_move = possible_moves[0] if len(possible_moves) == 1 else self.opening_book_move(game_state)
+        if instant_move is not None:
             if self.turns_remaining_in_round == 1:
                 # In case this was the last turn, we need to reset the counters
                 self.time_remaining_in_round = self.time_per_k_turns
@@ -52,54 +52,17 @@ class Player(simple_player.Player):
                 self.turns_remaining_in_round -= 1
                 self.time_remaining_in_round -= (
                     time.process_time() - self.clock)
-            # anyway we return the only possible move.
-            return possible_moves[0]
-
-        current_depth = 1
-        prev_alpha = -INFINITY
+            # anyway we return the move.
+            return instant_move
 
         # Choosing an arbitrary move in case Minimax does not return an answer:
         best_move = possible_moves[0]
 
-        # Initialize Minimax algorithm, still not running anything
-        minimax = MiniMaxWithAlphaBetaPruning(self.utility, self.color, self.no_more_time,
-                                              self.selective_deepening_criterion)
-
-        # Iterative deepening until the time runs out.
-        while True:
-
-            print('going to depth: {}, remaining time: {}, prev_alpha: {}, best_move: {}'.format(
-                current_depth,
-                self.time_for_current_move -
-                (time.process_time() - self.clock),
-                prev_alpha,
-                best_move))
-
-            try:
-                (alpha, move), run_time = run_with_limited_time(
-                    minimax.search, (game_state, current_depth, -
-                                     INFINITY, INFINITY, True), {},
-                    self.time_for_current_move - (time.process_time() - self.clock))
-            except (ExceededTimeError, MemoryError):
-                print('no more time, achieved depth {}'.format(current_depth))
-                break
-
-            if self.no_more_time():
-                print('no more time')
-                break
-
-            prev_alpha = alpha
-            best_move = move
-
-            if alpha == INFINITY:
-                print('the move: {} will guarantee victory.'.format(best_move))
-                break
-
-            if alpha == -INFINITY:
-                print('all is lost')
-                break
-
-            current_depth += 1
+        # Iterative deepening on the search worker until the time (or the search limit) runs out.
+        result = self.search(game_state, self.time_for_current_move - (time.process_time() - self.clock))
+        if result.best_move() is not None:
+            best_move = result.best_move()
+        self.report_search(result, best_move)
 
         if self.turns_remaining_in_round == 1:
             self.turns_remaining_in_round = self.k
@@ -128,32 +91,20 @@ class Player(simple_player.Player):
         return MAX_DISTANCE_FROM_CENTER - distance
 
     def utility(self, state):
-        if len(state.get_possible_moves()) == 0:
+        if not state.has_legal_move():
             return INFINITY if state.curr_player != self.color else -INFINITY
         if state.turns_since_last_jump >= MAX_TURNS_NO_JUMP:
             return 0
 
-        piece_counts = defaultdict(lambda: 0)
-
-        my_rows_score = 0
-        op_rows_score = 0
-        my_kings_dist_score = 0
-        op_kings_dist_score = 0
+        piece_counts = state.piece_counts
         opponent_color = OPPONENT_COLOR[self.color]
-        for loc, loc_val in state.board.items():
-            if loc_val != EM:
-                piece_counts[loc_val] += 1
-                if loc_val in MY_COLORS[self.color]:
-                    my_rows_score += loc[0]
-
-                    if loc_val == KING_COLOR[self.color]:
-                        my_kings_dist_score += self.grade_distance(
-                            self.distance_from_center(loc))
-                else:
-                    op_rows_score += (BOARD_ROWS-loc[0])
-                    if loc_val == KING_COLOR[opponent_color]:
-                        op_kings_dist_score += self.grade_distance(
-                            self.distance_from_center(loc))
+        opponent_tools = piece_counts[PAWN_COLOR[opponent_color]] + piece_counts[KING_COLOR[opponent_color]]
+
+        # My rows are counted from row 0, the opponent's from the other side of the board.
+        my_rows_score = state.row_sums[self.color]
+        op_rows_score = BOARD_ROWS * opponent_tools - state.row_sums[opponent_color]
+        my_kings_dist_score = state.king_centrality[self.color]
+        op_kings_dist_score = state.king_centrality[opponent_color]
 
         my_u = ((PAWN_WEIGHT * piece_counts[PAWN_COLOR[self.color]]) +
                 (KING_WEIGHT * piece_counts[KING_COLOR[self.color]]))
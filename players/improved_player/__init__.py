@@ -3,7 +3,7 @@
 # ===============================================================================
 
 import abstract
-from utils import MiniMaxWithAlphaBetaPruning, INFINITY, run_with_limited_time, ExceededTimeError
+from utils import SearchWorker, default_stats_sink
 from checkers.consts import EM, PAWN_COLOR, KING_COLOR, OPPONENT_COLOR, MAX_TURNS_NO_JUMP
 import time
 from collections import defaultdict
@@ -51,6 +51,12 @@ class Player(simple_player.Player):
         self.partial_amount = 2
         self.time_for_current_move = self.time_remaining_in_round / self.partial_amount
 
+        # The Minimax algorithm, its transposition table and its move ordering live for the whole game.
+        self.minimax = self.create_minimax()
+        self.search_worker = SearchWorker(self.minimax)
+        self.opening_book = self.create_opening_book()
+        self.stats_sink = default_stats_sink()
+
     def get_move(self, game_state, possible_moves):
         """
         We updated the get_move method in order for it to fit to our time management technique.
@@ -62,8 +68,11 @@ class Player(simple_player.Player):
         self.clock = time.process_time()
         # updating the time for the current move according tot he partial amount.
         self.time_for_current_move = self.time_remaining_in_round / self.partial_amount
+        # A move that needs no search: the only one, or a move from the opening book. The time it does
+        # not spend is left for the next moves of the round.
+        instant_move = possible_moves[0] if len(possible_moves) == 1 else self.opening_book_move(game_state)
         # increasing the partial amount.
-        if len(possible_moves) == 1:
+        if instant_move is not None:
             if self.turns_remaining_in_round == 1:
                 """
                 If that is the last turn in the round, we reset the turns and the time counters. As well the partial
@@ -80,51 +89,16 @@ class Player(simple_player.Player):
                 self.turns_remaining_in_round -= 1
                 # update the remaining time in the current round
                 self.time_remaining_in_round -= (time.process_time() - self.clock)  # Update remaining time
-            return possible_moves[0]
-
-        current_depth = 1
-        prev_alpha = -INFINITY
+            return instant_move
 
         # Choosing an arbitrary move in case Minimax does not return an answer:
         best_move = possible_moves[0]
 
-        # Initialize Minimax algorithm, still not running anything
-        minimax = MiniMaxWithAlphaBetaPruning(self.utility, self.color, self.no_more_time,
-                                              self.selective_deepening_criterion)
-
-        # Iterative deepening until the time runs out.
-        while True:
-
-            print('going to depth: {}, remaining time: {}, prev_alpha: {}, best_move: {}'.format(
-                current_depth,
-                self.time_for_current_move - (time.process_time() - self.clock),
-                prev_alpha,
-                best_move))
-
-            try:
-                (alpha, move), run_time = run_with_limited_time(
-                    minimax.search, (game_state, current_depth, -INFINITY, INFINITY, True), {},
-                    self.time_for_current_move - (time.process_time() - self.clock))
-            except (ExceededTimeError, MemoryError):
-                print('no more time, achieved depth {}'.format(current_depth))
-                break
-
-            if self.no_more_time():
-                print('no more time')
-                break
-
-            prev_alpha = alpha
-            best_move = move
-
-            if alpha == INFINITY:
-                print('the move: {} will guarantee victory.'.format(best_move))
-                break
-
-            if alpha == -INFINITY:
-                print('all is lost')
-                break
-
-            current_depth += 1
+        # Iterative deepening on the search worker until the time (or the search limit) runs out.
+        result = self.search(game_state, self.time_for_current_move - (time.process_time() - self.clock))
+        if result.best_move() is not None:
+            best_move = result.best_move()
+        self.report_search(result, best_move)
 
         if self.turns_remaining_in_round == 1:
             # initializing the time,turns and partial amount.
@@ -0,0 +1,327 @@
+#===============================================================================
+# Imports
+#===============================================================================
+
+import abstract
+from utils import default_stats_sink, process_context
+from checkers.board import GameState
+from checkers.batch import GameBatch, BATCH_RESULTS
+from checkers.consts import OPPONENT_COLOR, MAX_TURNS_NO_JUMP, TIE
+import numpy as np
+import multiprocessing
+import collections
+import copy
+import math
+import time
+import os
+
+#===============================================================================
+# Globals
+#===============================================================================
+
+# The exploration constant of UCT.
+EXPLORATION = math.sqrt(2)
+# The leaves selected at once, and the random playouts (games of the batch simulator) from every one of them. A
+# batch of playouts is the job of a single playout process.
+LEAVES_PER_BATCH = 16
+PLAYOUTS_PER_LEAF = 4
+# The batches sent before waiting for the results of the first. The leaves of a batch are selected with the virtual
+# losses of the batches in flight, so the shape of the tree depends on it: it is fixed, not the number of processes,
+# for a search within a search limit to be the same on every machine. More processes than this are of no use.
+BATCHES_IN_FLIGHT = 8
+# The playouts of a move under a search limit without a number of nodes (see set_search_limit).
+DEFAULT_LIMIT_PLAYOUTS = 4096
+
+#===============================================================================
+# Playouts
+#===============================================================================
+
+def run_playouts(leaf_states, playouts_per_leaf, seed):
+    """Plays random games from every leaf state to their end, all of them in one GameBatch.
+    :param leaf_states: The leaf states, packed by GameState.to_bytes to be sent to a playout process cheaply.
+    :return: The results of the games (see checkers.batch.BATCH_RESULTS) of every leaf, an array of
+             (leaves, playouts_per_leaf).
+    """
+    states = [GameState.from_bytes(data) for data in leaf_states for _ in range(playouts_per_leaf)]
+    batch = GameBatch.from_states(states)
+    return batch.play(np.random.default_rng(seed)).reshape(len(leaf_states), playouts_per_leaf)
+
+
+def terminal_result(state):
+    """:return: The result of a state a move was just made to, by the rules of run_game.GameRunner: the
+             winner, TIE, or None if the game goes on.
+    """
+    if state.turns_since_last_jump >= MAX_TURNS_NO_JUMP:
+        return TIE
+    if not state.has_legal_move():
+        return OPPONENT_COLOR[state.curr_player]
+    return None
+
+#===============================================================================
+# Tree
+#===============================================================================
+
+class Node:
+    __slots__ = ('move', 'children', 'untried_moves', 'visits', 'reward', 'result')
+
+    def __init__(self, move=None, result=None):
+        """A node of the search tree: the state after a move.
+        visits and reward are of the playouts through the node, the reward from the side of the player who made
+        the move: 1 for a win and 0.5 for a tie. The playouts in flight count as visits without a reward (a
+        virtual loss), so the leaves selected together spread out.
+        untried_moves is None until the node is expanded, when the state is at hand.
+
+        :param result: The result of the game if the move ended it, see terminal_result.
+        """
+        self.move = move
+        self.children = []
+        self.untried_moves = None
+        self.visits = 0
+        self.reward = 0.0
+        self.result = result
+
+    def uct_child(self):
+        """:return: The child with the highest upper confidence bound (UCT)."""
+        log_visits = math.log(self.visits)
+        return max(self.children,
+                   key=lambda child: child.reward / child.visits + EXPLORATION * math.sqrt(log_visits / child.visits))
+
+
+def tree_size(root):
+    """:return: The number of nodes of the tree under root, root included."""
+    size = 0
+    nodes = [root]
+    while nodes:
+        node = nodes.pop()
+        size += 1
+        nodes.extend(node.children)
+    return size
+
+#===============================================================================
+# Player
+#===============================================================================
+
+class Player(abstract.AbstractPlayer):
+    # The number of processes running the playouts. 0 runs them in this process.
+    playout_processes = min(multiprocessing.cpu_count(), BATCHES_IN_FLIGHT)
+    # A utils.SearchLimit replacing the time limit of the searches, see set_search_limit.
+    search_limit = None
+
+    def __init__(self, setup_time, player_color, time_per_k_turns, k):
+        abstract.AbstractPlayer.__init__(self, setup_time, player_color, time_per_k_turns, k)
+        # The playouts run in other processes, which this process's CPU time does not count, so the player keeps
+        # to its time by the wall clock.
+        self.clock = time.perf_counter()
+
+        # The same split of the time as simple_player: (remaining time / remaining turns) for each turn in round,
+        # with a spare time of 0.05 seconds.
+        self.turns_remaining_in_round = self.k
+        self.time_remaining_in_round = self.time_per_k_turns
+        self.time_for_current_move = self.time_remaining_in_round / self.turns_remaining_in_round - 0.05
+
+        # The tree is kept between the moves: root is the node of root_state, the state after the last move of
+        # the player, and the next search starts from the subtree of the opponent's reply.
+        self.root = None
+        self.root_state = None
+        self.rng = np.random.default_rng()
+        self.pool = process_context().Pool(self.playout_processes) if self.playout_processes else None
+        # Where the statistics of every search go: printed, or to the JSONL file named by SEARCH_STATS_ENV.
+        self.stats_sink = default_stats_sink()
+
+    def get_move(self, game_state, possible_moves):
+        self.clock = time.perf_counter()
+        self.time_for_current_move = self.time_remaining_in_round / self.turns_remaining_in_round - 0.05
+        root, reused_nodes = self.find_root(game_state)
+        if len(possible_moves) == 1:
+            best_move = possible_moves[0]
+        else:
+            stats = self.search(root, game_state)
+            stats['reused_nodes'] = reused_nodes
+            best_child = max(root.children, key=lambda child: child.visits)
+            best_move = possible_moves[possible_moves.index(best_child.move)]
+            self.report_search(stats, root, best_child, best_move)
+        self.advance_root(root, game_state, best_move)
+
+        if self.turns_remaining_in_round == 1:
+            self.turns_remaining_in_round = self.k
+            self.time_remaining_in_round = self.time_per_k_turns
+        else:
+            self.turns_remaining_in_round -= 1
+            self.time_remaining_in_round -= (time.perf_counter() - self.clock)
+        return best_move
+
+    def find_root(self, game_state):
+        """Looks the state up among the replies to the last move of the player in the kept tree.
+        :return: A tuple: (The node of the state: the one of the kept tree, or a new one, The number of nodes
+                 of the tree it brings along)
+        """
+        if self.root is not None:
+            packed_state = game_state.to_bytes()
+            for child in self.root.children:
+                state = copy.copy(self.root_state)
+                state.perform_move(child.move)
+                if state.to_bytes() == packed_state:
+                    return child, tree_size(child)
+        return Node(), 0
+
+    def advance_root(self, root, game_state, move):
+        """Keeps the subtree of the move for the next search, and drops the rest of the tree."""
+        self.root = next((child for child in root.children if child.move == move), None)
+        self.root_state = None
+        if self.root is not None:
+            self.root_state = copy.copy(game_state)
+            self.root_state.perform_move(move)
+
+    def set_search_limit(self, search_limit):
+        """Limits the searches by playouts instead of time, and seeds the playouts, so the player makes the same
+        moves in the same positions on every machine. The nodes of the limit are the playouts of a move (the tree
+        has no depth to limit); a limit without nodes plays DEFAULT_LIMIT_PLAYOUTS.
+        :param search_limit: A utils.SearchLimit, or None to search by time again.
+        """
+        self.search_limit = search_limit
+        if search_limit is not None:
+            self.rng = np.random.default_rng(search_limit.seed)
+
+    def out_of_playouts(self, playouts, pending_playouts):
+        """:return: Whether to stop sending batches of playouts: the search limit is reached, or at the playout rate
+                 so far, the playouts in flight and another batch would not finish in the time for the move. By
+                 time, a single batch is sent until the first results give the rate.
+        """
+        batch_playouts = LEAVES_PER_BATCH * PLAYOUTS_PER_LEAF
+        if self.search_limit is not None:
+            return playouts + pending_playouts >= (self.search_limit.nodes or DEFAULT_LIMIT_PLAYOUTS)
+        if not playouts:
+            return pending_playouts > 0
+        elapsed = time.perf_counter() - self.clock
+        elapsed += elapsed / playouts * (pending_playouts + batch_playouts)
+        return elapsed >= self.time_for_current_move
+
+    def search(self, root, game_state):
+        """Runs UCT from the root until the time (or the search limit) runs out. Batches of leaves are selected
+        and their playouts sent to the playout processes (or played here, without them), up to BATCHES_IN_FLIGHT
+        at a time, and the results are taken in the order the batches were sent, so a search within a search
+        limit is the same with any number of processes.
+        :return: A dict of the statistics of the search.
+        """
+        start_size = tree_size(root)
+        in_flight = collections.deque()
+        playouts = 0
+        while True:
+            # At least one batch, so the root has children to choose from.
+            while len(in_flight) < BATCHES_IN_FLIGHT and (not playouts and not in_flight or not self.out_of_playouts(
+                    playouts, sum(len(paths) for paths, _ in in_flight) * PLAYOUTS_PER_LEAF)):
+                paths, leaf_states, terminal_playouts = self.select_leaves(root, game_state)
+                playouts += terminal_playouts
+                if not paths:
+                    continue
+                seed = int(self.rng.integers(2 ** 63))
+                if self.pool is None:
+                    job = run_playouts(leaf_states, PLAYOUTS_PER_LEAF, seed)
+                else:
+                    job = self.pool.apply_async(run_playouts, (leaf_states, PLAYOUTS_PER_LEAF, seed))
+                in_flight.append((paths, job))
+            if not in_flight:
+                break
+            paths, job = in_flight.popleft()
+            results = job if self.pool is None else job.get()
+            for path, leaf_results in zip(paths, results):
+                self.backpropagate(path, [BATCH_RESULTS[result] for result in leaf_results.tolist()])
+            playouts += len(paths) * PLAYOUTS_PER_LEAF
+        search_time = time.perf_counter() - self.clock
+        size = tree_size(root)
+        return {
+            'playouts': playouts,
+            'time': search_time,
+            'playouts_per_second': playouts / search_time if search_time > 0 else None,
+            'tree_size': size,
+            'new_nodes': size - start_size,
+        }
+
+    def select_leaves(self, root, game_state):
+        """Selects a batch of leaves to play out, with a virtual loss for each. The leaves that end the game are
+        backpropagated at once instead, as PLAYOUTS_PER_LEAF playouts.
+        :return: A tuple: (The path from the root of every leaf, The packed states of the leaves, The number of
+                 playouts of the leaves that end the game)
+        """
+        paths = []
+        leaf_states = []
+        terminal_playouts = 0
+        for _ in range(LEAVES_PER_BATCH):
+            path, state = self.select_leaf(root, copy.copy(game_state))
+            leaf = path[-1]
+            if leaf.result is not None:
+                self.backpropagate(path, [leaf.result] * PLAYOUTS_PER_LEAF)
+                terminal_playouts += PLAYOUTS_PER_LEAF
+                continue
+            for node in path:
+                node.visits += PLAYOUTS_PER_LEAF
+            paths.append(path)
+            leaf_states.append(state.to_bytes())
+        return paths, leaf_states, terminal_playouts
+
+    def select_leaf(self, root, state):
+        """Descends by UCT from the root to a node with untried moves, and adds the node of one of them.
+        :param state: A copy of the state of the root, which is moved along.
+        :return: A tuple: (The list of nodes from the root to the leaf, The state of the leaf)
+        """
+        node = root
+        path = [node]
+        while node.result is None:
+            if node.untried_moves is None:
+                node.untried_moves = state.get_possible_moves()[:]
+                self.rng.shuffle(node.untried_moves)
+            if node.untried_moves:
+                move = node.untried_moves.pop()
+                state.perform_move(move)
+                child = Node(move, terminal_result(state))
+                node.children.append(child)
+                path.append(child)
+                break
+            node = node.uct_child()
+            state.perform_move(node.move)
+            path.append(node)
+        return path, state
+
+    def backpropagate(self, path, results):
+        """Adds the results of the playouts of a leaf to the nodes on its path, whose visits already count them
+        unless the leaf ended the game.
+        :param results: The results of the games: the winner or TIE.
+        """
+        leaf = path[-1]
+        virtual_visits = leaf.result is None
+        # The player who made the move of the root is the opponent of the player to move there.
+        mover = OPPONENT_COLOR[self.color]
+        for node in path:
+            if not virtual_visits:
+                node.visits += len(results)
+            node.reward += sum(1.0 if result == mover else 0.5 if result == TIE else 0.0 for result in results)
+            mover = OPPONENT_COLOR[mover]
+
+    def report_search(self, stats, root, best_child, move):
+        """Passes the statistics of a search to the stats sink, with the visits of the root and the value of the
+        chosen move: its mean reward.
+        """
+        record = dict(stats)
+        record['root_visits'] = root.visits
+        record['value'] = best_child.reward / best_child.visits
+        record.update({
+            'player': repr(self),
+            'color': self.color,
+            'move': str(move),
+            'time_limit': self.time_for_current_move,
+            'search_limit': repr(self.search_limit) if self.search_limit is not None else None,
+            'pid': os.getpid(),
+        })
+        self.stats_sink(record)
+
+    def close(self):
+        """Ends the playout processes."""
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def __repr__(self):
+        return '{} {}'.format(abstract.AbstractPlayer.__repr__(self), 'mcts')
+
+# c:\python35\python.exe run_game.py 3 3 3 y mcts_player better_h_player
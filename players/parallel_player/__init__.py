@@ -0,0 +1,22 @@
+
+# ===============================================================================
+# Imports
+# ===============================================================================
+
+from players import better_h_player
+import abstract
+import multiprocessing
+
+# ===============================================================================
+# Player
+# ===============================================================================
+
+
+class Player(better_h_player.Player):
+    # The better heuristic player, splitting the root moves of its search across all the CPUs.
+    search_processes = multiprocessing.cpu_count()
+
+    def __repr__(self):
+        return '{} {}'.format(abstract.AbstractPlayer.__repr__(self), 'parallel')
+
+# c:\python35\python.exe run_game.py 3 3 3 y parallel_player better_h_player
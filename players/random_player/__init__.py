@@ -3,6 +3,8 @@ import random
 
 
 class Player(abstract.AbstractPlayer):
+    needs_timing = False
+
     def __init__(self, setup_time, player_color, time_per_k_turns, k):
         abstract.AbstractPlayer.__init__(self, setup_time, player_color, time_per_k_turns, k)
 
@@ -4,10 +4,13 @@
 #===============================================================================
 
 import abstract
-from utils import MiniMaxWithAlphaBetaPruning, INFINITY, run_with_limited_time, ExceededTimeError
-from checkers.consts import EM, PAWN_COLOR, KING_COLOR, OPPONENT_COLOR, MAX_TURNS_NO_JUMP
+from utils import (MiniMaxWithAlphaBetaPruning, ParallelMiniMaxWithAlphaBetaPruning, TranspositionTable,
+                   SharedTranspositionTable, MoveOrdering, SearchWorker, INFINITY, default_stats_sink)
+from checkers.tablebase import EndgameTablebase
+from checkers.book import OpeningBook
+from checkers.consts import PAWN_COLOR, KING_COLOR, OPPONENT_COLOR, MAX_TURNS_NO_JUMP
 import time
-from collections import defaultdict
+import os
 
 #===============================================================================
 # Globals
@@ -21,6 +24,15 @@ KING_WEIGHT = 1.5
 #===============================================================================
 
 class Player(abstract.AbstractPlayer):
+    # The number of processes to split the root moves of the search across. 0 searches in this process only.
+    search_processes = 0
+    # A utils.SearchLimit replacing the time limit of the searches, see set_search_limit.
+    search_limit = None
+    # Whether the player uses the tablebases of make_tablebases.py and the opening book of make_book.py, when they
+    # exist. Without them its searches do not depend on the files on disk (see bench.py).
+    use_tablebase = True
+    use_opening_book = True
+
     def __init__(self, setup_time, player_color, time_per_k_turns, k):
         abstract.AbstractPlayer.__init__(self, setup_time, player_color, time_per_k_turns, k)
         self.clock = time.process_time()
@@ -31,55 +43,53 @@ class Player(abstract.AbstractPlayer):
         self.time_remaining_in_round = self.time_per_k_turns
         self.time_for_current_move = self.time_remaining_in_round / self.turns_remaining_in_round - 0.05
 
+        # The Minimax algorithm, its transposition table and its move ordering statistics live for the
+        # whole game, so every iteration and every turn reuses what was learned before it.
+        self.minimax = self.create_minimax()
+        self.search_worker = SearchWorker(self.minimax)
+        self.opening_book = self.create_opening_book()
+        # Where the statistics of every search go: printed, or to the JSONL file named by SEARCH_STATS_ENV.
+        self.stats_sink = default_stats_sink()
+
+    def create_minimax(self):
+        """Creates the Minimax algorithm of the player, splitting the root moves across search_processes
+        processes, which share one transposition table, when it is set.
+        Endgames are looked up in the tablebases generated by make_tablebases.py, if there are any and
+        use_tablebase is set.
+        """
+        tablebase = EndgameTablebase() if self.use_tablebase else None
+        if self.search_processes:
+            return ParallelMiniMaxWithAlphaBetaPruning(self.utility, self.color, self.no_more_time,
+                                                       self.selective_deepening_criterion, SharedTranspositionTable(),
+                                                       MoveOrdering(), self.search_processes,
+                                                       tablebase=tablebase)
+        return MiniMaxWithAlphaBetaPruning(self.utility, self.color, self.no_more_time,
+                                           self.selective_deepening_criterion, TranspositionTable(), MoveOrdering(),
+                                           tablebase)
+
+    def create_opening_book(self):
+        """:return: The OpeningBook of make_book.py, or an empty one if use_opening_book is not set."""
+        return OpeningBook() if self.use_opening_book else OpeningBook(None)
+
     def get_move(self, game_state, possible_moves):
         self.clock = time.process_time()
         self.time_for_current_move = self.time_remaining_in_round / self.turns_remaining_in_round - 0.05
         if len(possible_moves) == 1:
             return possible_moves[0]
 
-        current_depth = 1
-        prev_alpha = -INFINITY
-
         # Choosing an arbitrary move in case Minimax does not return an answer:
         best_move = possible_moves[0]
-        
-        # Initialize Minimax algorithm, still not running anything
-        minimax = MiniMaxWithAlphaBetaPruning(self.utility, self.color, self.no_more_time, 
-                                              self.selective_deepening_criterion)
-
-        # Iterative deepening until the time runs out.
-        while True:
-            
-            print('going to depth: {}, remaining time: {}, prev_alpha: {}, best_move: {}'.format(
-                current_depth, 
-                self.time_for_current_move - (time.process_time() - self.clock),
-                prev_alpha,
-                best_move))
-
-            try:
-                (alpha, move), run_time = run_with_limited_time(
-                    minimax.search, (game_state, current_depth, -INFINITY, INFINITY, True), {},
-                    self.time_for_current_move - (time.process_time() - self.clock))
-            except (ExceededTimeError, MemoryError):
-                print('no more time, achieved depth {}'.format(current_depth))
-                break
-
-            if self.no_more_time():
-                print('no more time')
-                break
-
-            prev_alpha = alpha
-            best_move = move
-
-            if alpha == INFINITY:
-                print('the move: {} will guarantee victory.'.format(best_move))
-                break
-
-            if alpha == -INFINITY:
-                print('all is lost')
-                break
-
-            current_depth += 1
+
+        book_move = self.opening_book_move(game_state)
+        if book_move is not None:
+            # The time not spent stays in time_remaining_in_round, for the next moves of the round.
+            best_move = book_move
+        else:
+            # Iterative deepening on the search worker until the time (or the search limit) runs out.
+            result = self.search(game_state, self.time_for_current_move - (time.process_time() - self.clock))
+            if result.best_move() is not None:
+                best_move = result.best_move()
+            self.report_search(result, best_move)
 
         if self.turns_remaining_in_round == 1:
             self.turns_remaining_in_round = self.k
@@ -89,17 +99,66 @@ class Player(abstract.AbstractPlayer):
             self.time_remaining_in_round -= (time.process_time() - self.clock)
         return best_move
 
+    def set_search_limit(self, search_limit):
+        """Limits the searches by depth and nodes instead of time, and seeds the choice between opening book
+        moves, so the player makes the same moves in the same positions on every machine.
+        :param search_limit: A utils.SearchLimit, or None to search by time again.
+        """
+        self.search_limit = search_limit
+        if search_limit is not None:
+            self.opening_book.set_seed(search_limit.seed)
+
+    def search(self, game_state, time_limit):
+        """Searches the state by iterative deepening, until the time limit, or within the search limit if
+        there is one.
+        :return: A SearchResult.
+        """
+        if self.search_limit is not None:
+            return self.search_worker.iterative_deepening(game_state, None, self.search_limit.depth,
+                                                          self.search_limit.nodes)
+        return self.search_worker.iterative_deepening(game_state, time_limit)
+
+    def opening_book_move(self, game_state):
+        """Looks the state up in the opening book built by make_book.py.
+        :return: A book move, or None if the state is not in the book (or there is no book).
+        """
+        move = self.opening_book.choose_move(game_state)
+        if move is not None:
+            record = self.stats_context(move)
+            record['book'] = True
+            self.stats_sink(record)
+        return move
+
+    def stats_context(self, move):
+        """:return: The fields of a stats record about the player and its move."""
+        return {
+            'player': repr(self),
+            'color': self.color,
+            'move': str(move),
+            'time_limit': self.time_for_current_move,
+            'search_limit': repr(self.search_limit) if self.search_limit is not None else None,
+            'pid': os.getpid(),
+        }
+
+    def report_search(self, result, move):
+        """Passes the statistics of a search (see SearchResult.stats_record) to the stats sink."""
+        record = result.stats_record()
+        record.update(self.stats_context(move))
+        self.stats_sink(record)
+
+    def close(self):
+        """Ends the search worker thread, and the search processes if there are any."""
+        self.search_worker.close()
+        if hasattr(self.minimax, 'close'):
+            self.minimax.close()
+
     def utility(self, state):
-        if len(state.get_possible_moves()) == 0:
+        if not state.has_legal_move():
             return INFINITY if state.curr_player != self.color else -INFINITY
         if state.turns_since_last_jump >= MAX_TURNS_NO_JUMP:
             return 0
 
-        piece_counts = defaultdict(lambda: 0)
-        for loc_val in state.board.values():
-            if loc_val != EM:
-                piece_counts[loc_val] += 1
-        
+        piece_counts = state.piece_counts
         opponent_color = OPPONENT_COLOR[self.color]
         
         my_u = ((PAWN_WEIGHT * piece_counts[PAWN_COLOR[self.color]]) + 
@@ -122,6 +181,14 @@ class Player(abstract.AbstractPlayer):
     def no_more_time(self):
         return (time.process_time() - self.clock) >= self.time_for_current_move
 
+    def __getstate__(self):
+        # The utility is sent to the search processes as a bound method, so the player is pickled with it.
+        # The search machinery (threads, processes) stays in this process.
+        state = self.__dict__.copy()
+        state.pop('minimax', None)
+        state.pop('search_worker', None)
+        return state
+
     def __repr__(self):
         return '{} {}'.format(abstract.AbstractPlayer.__repr__(self), 'simple')
 
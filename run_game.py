@@ -1,15 +1,25 @@
 """
 A generic turn-based game runner.
 """
+import os
 import sys
+import time
+import random
 from checkers.board import GameState
 from checkers.consts import RED_PLAYER, BLACK_PLAYER, TIE, OPPONENT_COLOR, MAX_TURNS_NO_JUMP
 import utils
 import copy
 import players.interactive
 
+# The setup time, time per k turns and k of the headless runner by default. They matter only for the timed players.
+HEADLESS_SETUP_TIME = 2
+HEADLESS_TIME_PER_K_TURNS = 10
+HEADLESS_K = 5
+
+
 class GameRunner:
-    def __init__(self, setup_time, time_per_k_turns, k, verbose, red_player, black_player):
+    def __init__(self, setup_time, time_per_k_turns, k, verbose, red_player, black_player, search_limit=None,
+                 isolated='n'):
         """Game runner initialization.
 
         :param setup_time: Setup time allowed for each player in seconds.
@@ -20,6 +30,13 @@ class GameRunner:
         :param red_player: The name of the module containing the red player. E.g. "myplayer" will invoke an
             equivalent to "import players.myplayer" in the code.
         :param black_player: Same as 'red_player' parameter, but for the black one.
+        :param search_limit: An optional utils.SearchLimit, or its text (e.g. 'depth=6' or 'nodes=20000', see
+            SearchLimit.parse). The players that support it (set_search_limit) search within it instead of by
+            time, and their moves are not timed, so the game is the same on every machine and can be replayed.
+            The random module is seeded with its seed as well. '-' is no search limit.
+        :param isolated: 'y' - run each player (but the interactive one) in a process of its own, which is killed
+            when the player exceeds its time (see utils.IsolatedPlayer). 'n' - run the players in threads of this
+            process.
         """
 
         self.verbose = verbose.lower()
@@ -27,20 +44,33 @@ class GameRunner:
         self.time_per_k_turns = float(time_per_k_turns)
         self.k = int(k)
         self.players = {}
+        if search_limit == '-':
+            search_limit = None
+        elif isinstance(search_limit, str):
+            search_limit = utils.SearchLimit.parse(search_limit)
+        self.search_limit = search_limit
+        self.isolated = isolated.lower() == 'y'
 
         # Dynamically importing the players. This allows maximum flexibility and modularity.
         self.red_player = 'players.{}'.format(red_player)
         self.black_player = 'players.{}'.format(black_player)
         __import__(self.red_player)
         __import__(self.black_player)
-        red_is_interactive = sys.modules[self.red_player].Player == players.interactive.Player
-        black_is_interactive = sys.modules[self.black_player].Player == players.interactive.Player
+        red_is_untimed = self.is_untimed(sys.modules[self.red_player].Player)
+        black_is_untimed = self.is_untimed(sys.modules[self.black_player].Player)
         
         self.player_move_times = {
-            RED_PLAYER : utils.INFINITY if red_is_interactive else self.time_per_k_turns,
-            BLACK_PLAYER: utils.INFINITY if black_is_interactive else self.time_per_k_turns,
+            RED_PLAYER : utils.INFINITY if red_is_untimed else self.time_per_k_turns,
+            BLACK_PLAYER: utils.INFINITY if black_is_untimed else self.time_per_k_turns,
         }
 
+    def is_untimed(self, player_class):
+        """:return: Whether the moves of the players of a class get infinite time: interactive players, players
+            that move at once (see AbstractPlayer.needs_timing), and players searching within the search limit.
+        """
+        return (player_class == players.interactive.Player or not getattr(player_class, 'needs_timing', True) or
+                self.search_limit is not None and hasattr(player_class, 'set_search_limit'))
+
     def setup_player(self, player_class, player_color):
         """ An auxiliary function to populate the players list, and measure setup times on the go.
 
@@ -48,19 +78,39 @@ class GameRunner:
         :param player_color: Player color, passed as an argument to the player.
         :return: A boolean. True if the player exceeded the given time. False otherwise.
         """
+        args = (self.setup_time, player_color, self.time_per_k_turns, self.k)
+        if self.isolated and player_class != players.interactive.Player:
+            try:
+                player = utils.IsolatedPlayer(player_class, args, self.setup_time*1.5, self.search_limit)
+            except (utils.ExceededTimeError, MemoryError):
+                return True
+            self.players[player_color] = player
+            return player.setup_time > self.setup_time
+
         try:
-            player, measured_time = utils.run_with_limited_time(
-                player_class, (self.setup_time, player_color, self.time_per_k_turns, self.k), {}, self.setup_time*1.5)
+            player, measured_time = utils.run_with_limited_time(player_class, args, {}, self.setup_time*1.5)
         except MemoryError:
             return True
 
+        if self.search_limit is not None and hasattr(player, 'set_search_limit'):
+            player.set_search_limit(self.search_limit)
         self.players[player_color] = player
         return measured_time > self.setup_time
 
     def run(self):
-        """The main loop.
+        """The main loop. The players are closed (see close_players) however the game ends.
         :return: The winner.
         """
+        try:
+            return self.play_game()
+        finally:
+            self.close_players()
+
+    def play_game(self):
+        """Sets the players up and plays the game, see run."""
+        if self.search_limit is not None:
+            random.seed(self.search_limit.seed)
+
         # Setup each player 
         red_player_exceeded = self.setup_player(sys.modules[self.red_player].Player, RED_PLAYER)
         black_player_exceeded = self.setup_player(sys.modules[self.black_player].Player, BLACK_PLAYER)
@@ -86,8 +136,7 @@ class GameRunner:
                     winner = self.make_winner_result(OPPONENT_COLOR[board_state.curr_player])
                     break
                 # Get move from player
-                move, run_time = utils.run_with_limited_time(
-                    player.get_move, (copy.deepcopy(board_state), possible_moves), {}, remaining_run_time*1.5) ###
+                move, run_time = self.get_player_move(player, board_state, possible_moves, remaining_run_time*1.5)
                 
                 remaining_run_times[board_state.curr_player] -= run_time
                 if remaining_run_times[board_state.curr_player] < 0:
@@ -117,6 +166,24 @@ class GameRunner:
         self.end_game(winner)
         return winner
 
+    def get_player_move(self, player, board_state, possible_moves, time_limit):
+        """Gets the move of a player, within the time limit.
+        :return: A tuple: The move, and the running time of the player.
+        :raises ExceededTimeError: If the player exceeded the time limit.
+        """
+        if isinstance(player, utils.IsolatedPlayer):
+            # The state is copied by sending it to the player process.
+            return player.get_move(board_state, possible_moves, time_limit)
+        return utils.run_with_limited_time(player.get_move, (copy.deepcopy(board_state), possible_moves), {}, time_limit)
+
+    def close_players(self):
+        """Ends the processes of the isolated players, and the threads (and processes) of the players that
+        have a close method.
+        """
+        for player in self.players.values():
+            if hasattr(player, 'close'):
+                player.close()
+
     @staticmethod
     def end_game(winner):
         if winner == TIE:
@@ -145,11 +212,99 @@ class GameRunner:
         return winner
 
 
+class HeadlessGameRunner(GameRunner):
+
+    def __init__(self, setup_time, time_per_k_turns, k, red_player, black_player, search_limit=None):
+        """A game runner for playing many games back to back in this process, as fast as possible, e.g. for
+        generating self-play data: nothing is printed, and the players that need no timing (see is_untimed) are
+        set up and asked for their moves directly, without a thread or a copy of the board. The other players
+        are timed as usual. There can be no interactive player.
+        The parameters are as in GameRunner.
+        """
+        GameRunner.__init__(self, setup_time, time_per_k_turns, k, 'n', red_player, black_player, search_limit)
+        self.untimed = {color: move_time == utils.INFINITY for color, move_time in self.player_move_times.items()}
+        self.moves = 0
+
+    def setup_player(self, player_class, player_color):
+        if not self.untimed[player_color]:
+            return GameRunner.setup_player(self, player_class, player_color)
+        player = player_class(self.setup_time, player_color, self.time_per_k_turns, self.k)
+        if self.search_limit is not None and hasattr(player, 'set_search_limit'):
+            player.set_search_limit(self.search_limit)
+        self.players[player_color] = player
+        return False
+
+    def get_player_move(self, player, board_state, possible_moves, time_limit):
+        self.moves += 1
+        if not self.untimed[player.color]:
+            return GameRunner.get_player_move(self, player, board_state, possible_moves, time_limit)
+        # The players do not change the state they are given.
+        return player.get_move(board_state, possible_moves), 0
+
+    def run_games(self, games, progress=None):
+        """Plays games with new players every game. With a search limit, every game gets its own seed (the
+        limit's seed plus the number of the game), so the games differ but can all be replayed.
+
+        :param games: The number of games.
+        :param progress: An optional function called with the number of the game and its winner after every game.
+        :return: A tuple: (A dict from RED_PLAYER, BLACK_PLAYER and TIE to the number of games it won, The number of
+                 moves played, The time it took in seconds)
+        """
+        results = {RED_PLAYER: 0, BLACK_PLAYER: 0, TIE: 0}
+        search_limit = self.search_limit
+        self.moves = 0
+        start = time.perf_counter()
+        with open(os.devnull, 'w') as devnull:
+            for game in range(games):
+                if search_limit is not None:
+                    self.search_limit = utils.SearchLimit(search_limit.depth, search_limit.nodes,
+                                                          search_limit.seed + game)
+                self.players = {}
+                stdout, sys.stdout = sys.stdout, devnull
+                try:
+                    winner = self.run()
+                finally:
+                    sys.stdout = stdout
+                results[TIE if winner == TIE else winner[0]] += 1
+                if progress is not None:
+                    progress(game, winner)
+        self.search_limit = search_limit
+        return results, self.moves, time.perf_counter() - start
+
+
+def run_headless(games, red_player, black_player, search_limit=None, time_per_k_turns=HEADLESS_TIME_PER_K_TURNS,
+                 k=HEADLESS_K):
+    """Plays games with a HeadlessGameRunner, printing the results and the games per second."""
+    runner = HeadlessGameRunner(HEADLESS_SETUP_TIME, time_per_k_turns, k, red_player, black_player, search_limit)
+    results, moves, elapsed = runner.run_games(games)
+    print('{} games in {:.2f}s: {:.2f} games/s, {:.0f} moves/s'.format(
+        games, elapsed, games / elapsed, moves / elapsed))
+    print('red {} wins: {}, black {} wins: {}, ties: {}'.format(
+        red_player, results[RED_PLAYER], black_player, results[BLACK_PLAYER], results[TIE]))
+    return results
+
+
 if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'headless':
+        try:
+            headless_games = int(sys.argv[2])
+            headless_players = sys.argv[3], sys.argv[4]
+            headless_limit = sys.argv[5] if len(sys.argv) > 5 else None
+            headless_times = [float(arg) for arg in sys.argv[6:8]]
+        except (IndexError, ValueError):
+            print("""Syntax: {0} headless games red_player black_player [search_limit|-] [time_per_k_turns] [k]
+For example: {0} headless 1000 random_player random_player
+Or: {0} headless 20 better_h_player improved_player depth=4""".format(sys.argv[0]))
+            sys.exit(2)
+        run_headless(headless_games, *headless_players, headless_limit, *headless_times)
+        sys.exit(0)
+
     try:
         GameRunner(*sys.argv[1:]).run()
     except TypeError:
-        print("""Syntax: {0} setup_time time_per_k_turns k verbose red_player black_player
+        print("""Syntax: {0} setup_time time_per_k_turns k verbose red_player black_player [search_limit|-] [isolated]
 For example: {0} 2 10 5 y interactive random_player
+Or, replayable: {0} 2 10 5 n better_h_player improved_player depth=6
+Or, with each player in a process of its own: {0} 2 10 5 n better_h_player improved_player - y
 Please read the docs in the code for more info.""".
               format(sys.argv[0]))
\ No newline at end of file
@@ -2,37 +2,32 @@
 # Important Notes (!)
 # ===============================================================================
 """
-    1. After every match we test, we delete the EXCEL file and rewrite everything
-    with the additional data.
+    1. The matches are played in parallel by tournament.run_tournament, on a process per CPU. Each result
+    is appended to <result file>.jsonl as soon as its match ends, and the EXCEL file is written once, when
+    all the matches are done.
 
-    2. Run DemoTest before Test - the main test might take a few hours so make sure
-    there are not runtime errors you didn't notice.
+    2. SPRTTest compares two players with as few games as it takes a sequential probability ratio test to
+    decide, reporting the Elo difference after each game.
+
+    3. An interrupted test is resumed by running it again: the matches already in the .jsonl file are not
+    played again. Delete the .jsonl file to start over.
 
-    3. DON'T OPEN THE EXCEL FILE BEFORE PROGRAM ENDS. if you do, it might crash
-    the program and you'll have to start all over.
+    4. Run DemoTest before Test - the main test might take a while so make sure
+    there are not runtime errors you didn't notice.
 
 """
 
 import sys
-import os
-import run_game
-import xlsxwriter
 from typing import List
-from run_game import TIE
-from checkers.consts import BLACK_PLAYER, RED_PLAYER
+import tournament
 
 # ===============================================================================
 # Globals
 # ===============================================================================
 
-LOSE_SCORE = 0
-TIE_SCORE = 0.5
-WIN_SCORE = 1
 TEST_COUNT = 1
 
-# Redirect output from game match to focus on results of each match
 CONSOLE_STREAM = sys.stdout
-sys.stdout = open(os.devnull, 'w')
 
 
 def Test(times: List[str], players_names: List[str], result_file_name: str):
@@ -40,48 +35,7 @@ def Test(times: List[str], players_names: List[str], result_file_name: str):
     print(f'Starting test #{TEST_COUNT}', file=CONSOLE_STREAM)
     TEST_COUNT += 1
 
-    # Args for runner
-    # 0: setup_time, 1: round_time, 2: k, 3: verbose, 4: Player1, 5: Player2
-    args = ['2', '', '5', 'n', '', '']
-
-    # Create each match
-    dous = []
-    for i in range(len(players_names) - 1):
-        for j in range(i + 1, len(players_names)):
-            dous.append((players_names[i], players_names[j]))  # P1 vs P2
-            dous.append((players_names[j], players_names[i]))  # P2 vs P1
-
-    # Store all results to update file on the run
-    results = [['TEST START']]
-
-    # Iterate times per round
-    for t in times:
-        args[1] = t
-        for player1, player2 in dous:
-            # FIRST GAME: player 1 starts
-            args[4], args[5] = player1, player2
-            runner = run_game.GameRunner(*args)
-            winner = runner.run()
-
-            match_result = [player1, player2, t]
-
-            if winner == TIE:
-                match_result.extend([TIE_SCORE, TIE_SCORE])
-            elif winner[0] == RED_PLAYER:
-                match_result.extend([WIN_SCORE, LOSE_SCORE])
-            else:
-                match_result.extend([LOSE_SCORE, WIN_SCORE])
-            results.append(match_result)
-
-            print(f'current result: {match_result}', file=CONSOLE_STREAM)
-
-            # Save results to an EXCEL file, create a workbook and add a worksheet.
-            workbook = xlsxwriter.Workbook(result_file_name + '.xlsx')
-            worksheet = workbook.add_worksheet()
-            for row, result in enumerate(results):
-                for col, field in enumerate(result):
-                    worksheet.write(row, col, field)
-            workbook.close()
+    tournament.run_tournament(times, players_names, result_file_name, console_stream=CONSOLE_STREAM)
 
 
 # Quickly run all tests to see there aren't any runtime errors.
@@ -92,6 +46,11 @@ def DemoTest():
     Test(demo_times, demo_players, demo_result_file)
 
 
+# Play improved_player against better_h_player until the SPRT tells whether it is stronger.
+def SPRTTest():
+    tournament.run_sprt('improved_player', 'better_h_player', '2', 'sprt_results', console_stream=CONSOLE_STREAM)
+
+
 if __name__ == '__main__':
     T = ['2', '10', '50']
     result_file = 'results'
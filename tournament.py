@@ -0,0 +1,376 @@
+# ===============================================================================
+# Imports
+# ===============================================================================
+
+import sys
+import os
+import json
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, as_completed, wait
+import run_game
+from run_game import TIE
+from utils import SEARCH_STATS_ENV, process_context, start_process_group, kill_process_group
+from checkers.consts import RED_PLAYER
+
+# ===============================================================================
+# Globals
+# ===============================================================================
+
+LOSE_SCORE = 0
+TIE_SCORE = 0.5
+WIN_SCORE = 1
+
+# The args of run_game.GameRunner, other than the time per k turns and the players.
+SETUP_TIME = '2'
+K = '5'
+VERBOSE = 'n'
+
+# The columns of a result row, in the workbook.
+RESULT_FIELDS = ['player1', 'player2', 'time', 'player1_score', 'player2_score']
+
+# The default SPRT: H0 is that the candidate is no stronger than the baseline (elo0), H1 that it is stronger by
+# elo1, each accepted with the given error rate of wrongly accepting it.
+SPRT_ELO0 = 0
+SPRT_ELO1 = 20
+SPRT_ALPHA = 0.05
+SPRT_BETA = 0.05
+SPRT_MAX_GAMES = 2000
+
+# The z-score of the error bars of the Elo estimate (95%).
+ELO_ERROR_Z = 1.96
+
+
+# ===============================================================================
+# Matches
+# ===============================================================================
+
+def schedule_matches(times, players_names):
+    """Lists the matches of a tournament: every pair of players plays twice, once with each of them starting,
+    for every time per k turns.
+
+    :param times: The times per k turns, as strings.
+    :param players_names: The names of the players, as given to run_game.
+    :return: A list of (player1, player2, time) matches. player1 is red, and starts.
+    """
+    pairs = []
+    for i in range(len(players_names) - 1):
+        for j in range(i + 1, len(players_names)):
+            pairs.append((players_names[i], players_names[j]))  # P1 vs P2
+            pairs.append((players_names[j], players_names[i]))  # P2 vs P1
+    return [(player1, player2, t) for t in times for player1, player2 in pairs]
+
+
+def play_match(match, stats_file=None):
+    """Plays a match. Runs in a process of the tournament's pool, with the output of the game thrown away.
+
+    :param match: A (player1, player2, time) match.
+    :param stats_file: An optional JSONL file for the players to append the statistics of their searches to.
+    :return: The result row: a dict with the RESULT_FIELDS.
+    """
+    player1, player2, t = match
+    if stats_file is not None:
+        os.environ[SEARCH_STATS_ENV] = stats_file
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        winner = run_game.GameRunner(SETUP_TIME, t, K, VERBOSE, player1, player2).run()
+    finally:
+        sys.stdout.close()
+        sys.stdout = sys.__stdout__
+
+    if winner == TIE:
+        scores = [TIE_SCORE, TIE_SCORE]
+    elif winner[0] == RED_PLAYER:
+        scores = [WIN_SCORE, LOSE_SCORE]
+    else:
+        scores = [LOSE_SCORE, WIN_SCORE]
+    return dict(zip(RESULT_FIELDS, [player1, player2, t] + scores))
+
+
+def match_of(result):
+    """:return: The (player1, player2, time) match a result row is of."""
+    return result['player1'], result['player2'], result['time']
+
+
+# ===============================================================================
+# Results
+# ===============================================================================
+
+def read_results(stream_file_name):
+    """Reads the results streamed so far, so an interrupted tournament can be resumed.
+    A last line cut short by the interruption is ignored.
+
+    :param stream_file_name: The JSONL file the results are streamed to.
+    :return: A list of result rows, in the order they finished.
+    """
+    results = []
+    if not os.path.exists(stream_file_name):
+        return results
+    with open(stream_file_name) as stream:
+        for line in stream:
+            try:
+                results.append(json.loads(line))
+            except ValueError:
+                break
+    return results
+
+
+def write_workbook(results, workbook_file_name):
+    """Writes the results to an EXCEL workbook, a row per match."""
+    # Imported here, so the processes playing the matches do not need it.
+    import xlsxwriter
+    workbook = xlsxwriter.Workbook(workbook_file_name)
+    worksheet = workbook.add_worksheet()
+    for col, field in enumerate(RESULT_FIELDS):
+        worksheet.write(0, col, field)
+    for row, result in enumerate(results, 1):
+        for col, field in enumerate(RESULT_FIELDS):
+            worksheet.write(row, col, result[field])
+    workbook.close()
+
+
+# ===============================================================================
+# Tournament
+# ===============================================================================
+
+def run_tournament(times, players_names, result_file_name, processes=None, console_stream=sys.stdout,
+                   stats_file=None):
+    """Plays all the matches of a tournament on a pool of processes.
+    Each result is appended to result_file_name.jsonl as soon as its match ends. Running the same tournament
+    again resumes it: the matches already in that file are not played again. When all the matches are done,
+    the results are written to result_file_name.xlsx, in the order of schedule_matches.
+
+    :param times: The times per k turns, as strings.
+    :param players_names: The names of the players, as given to run_game.
+    :param result_file_name: The name of the result files, without an extension.
+    :param processes: The number of matches to play at once. Defaults to the number of CPUs.
+    :param console_stream: Where to report the progress.
+    :param stats_file: An optional JSONL file for the players to append the statistics of their searches to.
+    :return: The result rows, in the order of schedule_matches.
+    """
+    stream_file_name = result_file_name + '.jsonl'
+    matches = schedule_matches(times, players_names)
+    done = {match_of(result): result for result in read_results(stream_file_name)}
+    pending = [match for match in matches if match not in done]
+    print('{} matches, {} already played'.format(len(matches), len(matches) - len(pending)), file=console_stream)
+
+    if pending:
+        # A fresh process per match, so no player state (or search process) outlives its match.
+        with open(stream_file_name, 'a') as stream, \
+                ProcessPoolExecutor(processes or multiprocessing.cpu_count(), max_tasks_per_child=1) as executor:
+            futures = [executor.submit(play_match, match, stats_file) for match in pending]
+            for future in as_completed(futures):
+                result = future.result()
+                stream.write(json.dumps(result) + '\n')
+                stream.flush()
+                done[match_of(result)] = result
+                print('current result: {}'.format([result[field] for field in RESULT_FIELDS]),
+                      file=console_stream)
+
+    results = [done[match] for match in matches]
+    write_workbook(results, result_file_name + '.xlsx')
+    return results
+
+
+# ===============================================================================
+# SPRT
+# ===============================================================================
+
+def score_to_elo(score):
+    """:return: The Elo difference that gives the expected score, under the logistic model."""
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+
+def elo_to_score(elo):
+    """:return: The expected score of a player elo points stronger than its opponent."""
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def score_stats(wins, draws, losses):
+    """:return: A tuple: (The mean score per game, The variance of the score of a game)"""
+    games = wins + draws + losses
+    mean = (wins * WIN_SCORE + draws * TIE_SCORE + losses * LOSE_SCORE) / games
+    variance = (wins * (WIN_SCORE - mean) ** 2 + draws * (TIE_SCORE - mean) ** 2 +
+                losses * (LOSE_SCORE - mean) ** 2) / games
+    if not variance:
+        # All the results are the same so far. Adding half a win and half a loss keeps a one sided match from
+        # looking certain (and undecidable) forever.
+        return score_stats(wins + 0.5, draws, losses + 0.5)
+    return mean, variance
+
+
+def elo_estimate(wins, draws, losses):
+    """Estimates the Elo difference from the results of the games so far.
+    :return: A tuple: (The Elo difference, The margin of its ELO_ERROR_Z error bars), or (0, INFINITY) before the
+    first game.
+    """
+    games = wins + draws + losses
+    if not games:
+        return 0.0, float('inf')
+    mean, variance = score_stats(wins, draws, losses)
+    margin = ELO_ERROR_Z * math.sqrt(variance / games)
+    return score_to_elo(mean), (score_to_elo(mean + margin) - score_to_elo(mean - margin)) / 2
+
+
+def sprt_llr(wins, draws, losses, elo0, elo1):
+    """The log likelihood ratio of H1 (the Elo difference is elo1) against H0 (it is elo0), approximating the
+    mean score of the games as normally distributed.
+    """
+    games = wins + draws + losses
+    if not games:
+        return 0.0
+    mean, variance = score_stats(wins, draws, losses)
+    s0, s1 = elo_to_score(elo0), elo_to_score(elo1)
+    return (s1 - s0) * (2 * mean - s0 - s1) / (2 * variance / games)
+
+
+def sprt_bounds(alpha, beta):
+    """:return: A tuple: (The LLR to accept H0 at, The LLR to accept H1 at)"""
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+def sprt_match(candidate, baseline, colors):
+    """Picks the players of the next game of an SPRT, balancing the colors: the candidate starts (plays red)
+    unless it has started more games than the baseline.
+
+    :param colors: A dict from the player that started to the number of games started, updated with this game.
+    :return: A (player1, player2) pair. player1 is red, and starts.
+    """
+    players = (candidate, baseline) if colors[candidate] <= colors[baseline] else (baseline, candidate)
+    colors[players[0]] += 1
+    return players
+
+
+def start_game_process(pids):
+    """The initializer of the processes of a ProcessPoolExecutor playing games that stop_executor may stop: puts
+    the process in a process group of its own, and reports its id.
+    :param pids: A multiprocessing.SimpleQueue for the ids of the processes.
+    """
+    start_process_group()
+    pids.put(os.getpid())
+
+
+def stop_executor(executor, pids):
+    """Shuts a ProcessPoolExecutor initialized by start_game_process down without waiting for its tasks: the
+    pending ones are cancelled, and the processes running the others are killed, with the processes they
+    started (e.g. the pools of the parallel player).
+    :param pids: The queue of the ids of the processes, given to start_game_process.
+    """
+    executor.shutdown(wait=False, cancel_futures=True)
+    while not pids.empty():
+        kill_process_group(pids.get())
+
+
+def run_sprt(candidate, baseline, t, result_file_name, elo0=SPRT_ELO0, elo1=SPRT_ELO1, alpha=SPRT_ALPHA,
+             beta=SPRT_BETA, max_games=SPRT_MAX_GAMES, processes=None, console_stream=sys.stdout, stats_file=None):
+    """Plays games between a candidate player and a baseline player until a sequential probability ratio test
+    accepts H0 (the candidate is elo0 stronger) or H1 (it is elo1 stronger), or max_games are played.
+    The Elo estimate, with its error bars, is reported after every game.
+    As in run_tournament, the games are played on a pool of processes, each result is appended to
+    result_file_name.jsonl as soon as its game ends, and running the same test again resumes it with the games
+    of this pairing and time already in that file. The candidate plays red in half the games, by the colors of
+    the results, which finish out of order. The games still running when the test decides are stopped, and not
+    counted.
+
+    :param candidate: The name of the player tested.
+    :param baseline: The name of the player it is compared with.
+    :param t: The time per k turns, as a string.
+    :param result_file_name: The name of the result file, without an extension.
+    :param elo0: The Elo difference of H0.
+    :param elo1: The Elo difference of H1.
+    :param alpha: The rate of accepting H1 when H0 is true.
+    :param beta: The rate of accepting H0 when H1 is true.
+    :param max_games: The number of games to stop at if the test does not decide.
+    :param processes: The number of games to play at once. Defaults to the number of CPUs.
+    :param console_stream: Where to report the progress.
+    :param stats_file: An optional JSONL file for the players to append the statistics of their searches to.
+    :return: A tuple: (H0, H1 or None when undecided, The Elo difference, Its error margin, The number of games)
+    """
+    stream_file_name = result_file_name + '.jsonl'
+    scores = {WIN_SCORE: 0, TIE_SCORE: 0, LOSE_SCORE: 0}
+    # The games started (and finished, when resuming) by each player.
+    colors = {candidate: 0, baseline: 0}
+    lower, upper = sprt_bounds(alpha, beta)
+
+    def add_result(result):
+        if result['time'] != t or {result['player1'], result['player2']} != {candidate, baseline}:
+            return False
+        scores[result['player1_score'] if result['player1'] == candidate else result['player2_score']] += 1
+        return True
+
+    def decision():
+        llr = sprt_llr(scores[WIN_SCORE], scores[TIE_SCORE], scores[LOSE_SCORE], elo0, elo1)
+        if llr <= lower:
+            return 'H0'
+        if llr >= upper:
+            return 'H1'
+        return None
+
+    def report():
+        elo, margin = elo_estimate(scores[WIN_SCORE], scores[TIE_SCORE], scores[LOSE_SCORE])
+        llr = sprt_llr(scores[WIN_SCORE], scores[TIE_SCORE], scores[LOSE_SCORE], elo0, elo1)
+        print('games: {}, W/D/L: {}/{}/{}, elo: {:.1f} +- {:.1f}, LLR: {:.2f} ({:.2f}, {:.2f})'.format(
+            sum(scores.values()), scores[WIN_SCORE], scores[TIE_SCORE], scores[LOSE_SCORE], elo, margin, llr,
+            lower, upper), file=console_stream)
+
+    for result in read_results(stream_file_name):
+        if add_result(result):
+            colors[result['player1']] += 1
+
+    processes = processes or multiprocessing.cpu_count()
+    # Every game process is a process group, so stop_executor can kill it with the processes it started.
+    context = process_context()
+    pids = context.SimpleQueue()
+    with open(stream_file_name, 'a') as stream, \
+            ProcessPoolExecutor(processes, mp_context=context, max_tasks_per_child=1, initializer=start_game_process,
+                                initargs=(pids,)) as executor:
+        running = set()
+        started = sum(scores.values())
+        while decision() is None and (running or started < max_games):
+            # Keeping every process busy, but not starting more games than max_games.
+            while len(running) < processes and started < max_games:
+                player1, player2 = sprt_match(candidate, baseline, colors)
+                running.add(executor.submit(play_match, (player1, player2, t), stats_file))
+                started += 1
+            finished, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                result = future.result()
+                stream.write(json.dumps(result) + '\n')
+                stream.flush()
+                add_result(result)
+                report()
+        if running:
+            # The test decided: the games still running would not be counted.
+            stop_executor(executor, pids)
+
+    elo, margin = elo_estimate(scores[WIN_SCORE], scores[TIE_SCORE], scores[LOSE_SCORE])
+    return decision(), elo, margin, sum(scores.values())
+
+
+if __name__ == '__main__' and len(sys.argv) > 1 and sys.argv[1] == 'sprt':
+    try:
+        result_file, candidate_player, baseline_player, T = sys.argv[2:6]
+        elo_bounds = [float(elo) for elo in sys.argv[6:8]] or [SPRT_ELO0, SPRT_ELO1]
+    except ValueError:
+        print("""Syntax: {0} sprt result_file candidate baseline time [elo0 elo1]
+For example: {0} sprt sprt_results improved_player better_h_player 2 0 20""".format(sys.argv[0]))
+        sys.exit(2)
+
+    hypothesis, elo_diff, elo_margin, game_count = run_sprt(candidate_player, baseline_player, T, result_file,
+                                                            *elo_bounds)
+    print('{} after {} games: elo {:.1f} +- {:.1f}'.format(
+        {'H0': 'H0 accepted', 'H1': 'H1 accepted', None: 'Undecided'}[hypothesis], game_count, elo_diff, elo_margin))
+
+elif __name__ == '__main__':
+    try:
+        result_file, players = sys.argv[1], sys.argv[2].split(',')
+        T = sys.argv[3].split(',')
+        pool_size = int(sys.argv[4]) if len(sys.argv) > 4 else None
+    except (IndexError, ValueError):
+        print("""Syntax: {0} result_file players times [processes]
+For example: {0} results simple_player,better_h_player 2,10,50 4
+Running it again with the same arguments resumes an interrupted tournament.""".format(sys.argv[0]))
+        sys.exit(2)
+
+    run_tournament(T, players, result_file, pool_size)
@@ -1,13 +1,32 @@
 """Generic utility functions
 """
 # from __future__ import print_function
-from threading import Thread
+from threading import Thread, Event
 from queue import Queue
+from multiprocessing import shared_memory
+from checkers.bitboard import pack_move, unpack_move
+from checkers.tablebase import WIN, DRAW
+from checkers.zobrist import plies_zobrist_key
+import multiprocessing
+import struct
+import weakref
+import json
+import math
+import os
+import signal
+import sys
 import time
-import copy
+try:
+    import resource
+except ImportError:
+    # Not on Windows: isolated players are limited by the wall clock only.
+    resource = None
 
 INFINITY = float(6000)
 
+# A running search checks its stop flag, its node limit and its no_more_time function once every this many nodes.
+STOP_CHECK_INTERVAL = 128
+
 
 class ExceededTimeError(RuntimeError):
     """Thrown when the given function exceeded its runtime.
@@ -62,9 +81,538 @@ def run_with_limited_time(func, args, kwargs, time_limit):
     return q_get
 
 
+def _limit_cpu_time(time_limit):
+    """Sets the CPU time limit of this process to its CPU time so far plus time_limit, rounded up, and a
+    second of grace. The system kills the process (SIGXCPU) when it runs out.
+    """
+    if resource is None or time_limit >= INFINITY:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft = int(math.ceil(usage.ru_utime + usage.ru_stime + time_limit)) + 1
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _isolated_player_main(connection, player_class, args, search_limit):
+    """The main function of the process of an IsolatedPlayer: creates the player, then answers every
+    (game state, possible moves, time limit) it receives with ('move', the move, its runtime), until it
+    receives None. A MemoryError is answered with ('memory',), and ends the process.
+    """
+    # A process group of its own, so the processes the player starts are killed with it.
+    start_process_group()
+    start = time.process_time()
+    try:
+        player = player_class(*args)
+    except MemoryError:
+        connection.send(('memory',))
+        return
+    if search_limit is not None and hasattr(player, 'set_search_limit'):
+        player.set_search_limit(search_limit)
+    connection.send(('ready', repr(player), time.process_time() - start))
+
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        game_state, possible_moves, time_limit = message
+        _limit_cpu_time(time_limit)
+        start = time.process_time()
+        try:
+            move = player.get_move(game_state, possible_moves)
+        except MemoryError:
+            connection.send(('memory',))
+            return
+        runtime = time.process_time() - start
+        # The output of the player comes before the runner's output about the move.
+        sys.stdout.flush()
+        connection.send(('move', move, runtime))
+
+
+def start_process_group():
+    """Puts this process in a process group of its own, so kill_process_group kills the processes it starts with
+    it. Does nothing where there are no process groups (on Windows).
+    """
+    if hasattr(os, 'setpgrp'):
+        os.setpgrp()
+
+
+def kill_process_group(pid):
+    """Kills a process that called start_process_group, and the processes it started. Where there are no
+    process groups, kills the process alone.
+    :param pid: The process id, which is also the id of its group.
+    """
+    try:
+        if hasattr(os, 'killpg'):
+            # The group outlives the process if it started others.
+            os.killpg(pid, signal.SIGKILL)
+        else:
+            os.kill(pid, signal.SIGTERM)
+    except OSError:
+        pass
+
+
+def _kill_player_process(process):
+    """Kills the process of an IsolatedPlayer, with the processes it started, and waits for it to end."""
+    kill_process_group(process.pid)
+    if process.is_alive():
+        process.kill()
+    process.join()
+
+
+# How long IsolatedPlayer.close waits for the player process to end by itself, in seconds.
+ISOLATED_PLAYER_CLOSE_TIMEOUT = 1
+
+
+class IsolatedPlayer:
+
+    def __init__(self, player_class, args, time_limit, search_limit=None):
+        """Runs a player in a long-lived process of its own, passing it the game states and getting its moves
+        over a pipe. A player that runs out of time is killed, with any process it started, instead of being
+        left running like the thread of run_with_limited_time, so it takes no CPU time from the players
+        after it. The process also has a CPU time limit, set before every move.
+
+        :param player_class: The class of the player. It (and the player's moves) must be picklable.
+        :param args: The args to create the player with.
+        :param time_limit: The time limit for creating the player, in seconds.
+        :param search_limit: An optional SearchLimit, for players that support it (set_search_limit).
+        :raises ExceededTimeError: If creating the player exceeded the time limit.
+        :raises MemoryError: If creating the player ran out of memory.
+        """
+        self.connection, child_connection = multiprocessing.Pipe()
+        # Not a daemon, so the player may start processes of its own (e.g. the parallel player).
+        self.process = multiprocessing.Process(target=_isolated_player_main,
+                                               args=(child_connection, player_class, args, search_limit))
+        self.process.start()
+        child_connection.close()
+        # Kills the process if this player is dropped without closing it, or at exit.
+        self.finalizer = weakref.finalize(self, _kill_player_process, self.process)
+        _, self.name, self.setup_time = self._receive(time_limit)
+
+    def _receive(self, time_limit):
+        """:return: The next message of the player process, within the time limit.
+        :raises ExceededTimeError: If it did not answer in time, or was killed by its CPU time limit.
+        :raises MemoryError: If it ran out of memory.
+        """
+        try:
+            answered = self.connection.poll(time_limit)
+            message = self.connection.recv() if answered else None
+        except (EOFError, OSError):
+            message = None
+        if message is None:
+            self.kill()
+            raise ExceededTimeError
+        if message[0] == 'memory':
+            self.kill()
+            raise MemoryError
+        return message
+
+    def get_move(self, game_state, possible_moves, time_limit):
+        """Asks the player for a move, see AbstractPlayer.get_move.
+        :param time_limit: The time limit in seconds.
+        :return: A tuple: The move, and the running time of the player (its CPU time).
+        :raises ExceededTimeError: If the player exceeded the time limit. The player process is killed.
+        :raises MemoryError: If the player ran out of memory. The player process is ended.
+        """
+        try:
+            self.connection.send((game_state, possible_moves, time_limit))
+        except (BrokenPipeError, OSError):
+            self.kill()
+            raise ExceededTimeError
+        _, move, runtime = self._receive(time_limit)
+        return move, runtime
+
+    def kill(self):
+        """Kills the player process, and the processes it started."""
+        self.finalizer()
+        self.connection.close()
+
+    def close(self):
+        """Ends the player process, killing it if it does not end by itself."""
+        if self.process.is_alive():
+            try:
+                self.connection.send(None)
+            except OSError:
+                pass
+            self.process.join(ISOLATED_PLAYER_CLOSE_TIMEOUT)
+        self.kill()
+
+    def __repr__(self):
+        return self.name
+
+
+# Bound types of a transposition table entry: the stored value is the exact minimax value,
+# a lower bound on it (the search failed high) or an upper bound on it (the search failed low).
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# Replacement schemes of a transposition table.
+# DEPTH_PREFERRED: keep the entry searched deeper, unless it is left over from an older search.
+# ALWAYS_REPLACE: the newest entry always wins.
+# TWO_TIER: each bucket has a depth-preferred slot and an always-replace slot.
+DEPTH_PREFERRED = 'depth'
+ALWAYS_REPLACE = 'always'
+TWO_TIER = 'two_tier'
+
+# Approximate memory used by one stored entry: the entry tuple, its key, value and the list slot
+# pointing to it. The best move itself is shared with the move list it came from.
+TT_ENTRY_BYTES = 200
+DEFAULT_TT_MEMORY_BYTES = 32 * 1024 * 1024
+
+
+class TranspositionTable:
+
+    def __init__(self, memory_bytes=DEFAULT_TT_MEMORY_BYTES, replacement=TWO_TIER):
+        """A fixed size table of search results, indexed by the Zobrist key of the state.
+        Each entry is a tuple: (key, depth, value, bound type, best move, search age).
+
+        :param memory_bytes: The memory budget of the table. The number of slots is fixed by it up front.
+        :param replacement: The replacement scheme: DEPTH_PREFERRED, ALWAYS_REPLACE or TWO_TIER.
+        """
+        if replacement not in (DEPTH_PREFERRED, ALWAYS_REPLACE, TWO_TIER):
+            raise ValueError('Unknown replacement scheme: {}'.format(replacement))
+        self.replacement = replacement
+        self.bucket_size = 2 if replacement == TWO_TIER else 1
+        self.bucket_count = max(memory_bytes // (TT_ENTRY_BYTES * self.bucket_size), 1)
+        self.slots = [None] * (self.bucket_count * self.bucket_size)
+        self.age = 0
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.overwrites = 0
+
+    def new_search(self):
+        """Marks the entries stored so far as old, so the depth-preferred slots may be replaced."""
+        self.age += 1
+
+    def clear(self):
+        self.slots = [None] * len(self.slots)
+
+    def probe(self, key):
+        """Looks up a state.
+
+        :param key: The Zobrist key of the state.
+        :return: The entry stored for the key, or None.
+        """
+        first = (key % self.bucket_count) * self.bucket_size
+        collided = False
+        for i in range(first, first + self.bucket_size):
+            entry = self.slots[i]
+            if entry is not None:
+                if entry[0] == key:
+                    self.hits += 1
+                    return entry
+                collided = True
+        self.misses += 1
+        if collided:
+            self.collisions += 1
+        return None
+
+    def store(self, key, depth, value, bound, best_move):
+        """Stores a search result, replacing an existing entry according to the replacement scheme.
+
+        :param key: The Zobrist key of the state.
+        :param depth: The depth the state was searched to.
+        :param value: The search value.
+        :param bound: EXACT, LOWER_BOUND or UPPER_BOUND.
+        :param best_move: The best move found in the state, or None.
+        """
+        first = (key % self.bucket_count) * self.bucket_size
+        if self.replacement == ALWAYS_REPLACE:
+            i = first
+        else:
+            i = first
+            entry = self.slots[first]
+            if (entry is not None and entry[0] != key and entry[5] == self.age and entry[1] > depth):
+                # The depth-preferred slot holds a deeper result from this search.
+                if self.replacement == DEPTH_PREFERRED:
+                    return
+                i = first + 1
+        entry = self.slots[i]
+        if entry is not None and entry[0] != key:
+            self.overwrites += 1
+        self.slots[i] = (key, depth, value, bound, best_move, self.age)
+
+    def stats(self):
+        """:return: A dict of the table's counters."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'collisions': self.collisions,
+            'overwrites': self.overwrites,
+            'slots': len(self.slots),
+            'used': sum(1 for entry in self.slots if entry is not None),
+        }
+
+
+# A SharedTranspositionTable entry is 3 words of 64 bits: the check word (key ^ value ^ data), the value
+# (a double) and the data word. The data word packs the depth (+SHARED_TT_DEPTH_OFFSET, 8 bits), the bound
+# type (2 bits), the search age (8 bits) and the best move (pack_move, the remaining bits).
+SHARED_TT_ENTRY_WORDS = 3
+SHARED_TT_ENTRY_BYTES = SHARED_TT_ENTRY_WORDS * 8
+SHARED_TT_DEPTH_OFFSET = 128
+SHARED_TT_AGE_MODULO = 256
+# The first word of the shared memory holds the age of the current search.
+SHARED_TT_HEADER_WORDS = 1
+
+_WORD = struct.Struct('<Q')
+_DOUBLE = struct.Struct('<d')
+
+
+def _release_shared_memory(memory, words, owner_pid):
+    words.release()
+    memory.close()
+    if os.getpid() == owner_pid:
+        memory.unlink()
+
+
+class SharedTranspositionTable:
+
+    def __init__(self, memory_bytes=DEFAULT_TT_MEMORY_BYTES, replacement=TWO_TIER, name=None):
+        """A transposition table in shared memory, so the search processes searching the same game reuse
+        each other's results. It has the same interface, and the same replacement schemes, as
+        TranspositionTable, and can be given to MiniMaxWithAlphaBetaPruning in its place.
+        The entries are packed 64-bit words, written without locks: the check word of an entry is the XOR
+        of its key with its other words, so an entry torn by two processes writing it at once does not
+        match its key, and is seen as missing.
+        The age of the search is advanced only by the process that created the table. The counters are
+        kept per process.
+
+        :param memory_bytes: The memory budget of the table. The number of slots is fixed by it up front.
+        :param replacement: The replacement scheme: DEPTH_PREFERRED, ALWAYS_REPLACE or TWO_TIER.
+        :param name: The name of the shared memory of an existing table to attach to, or None to create one.
+        """
+        if replacement not in (DEPTH_PREFERRED, ALWAYS_REPLACE, TWO_TIER):
+            raise ValueError('Unknown replacement scheme: {}'.format(replacement))
+        self.replacement = replacement
+        self.bucket_size = 2 if replacement == TWO_TIER else 1
+        if name is None:
+            self.bucket_count = max(memory_bytes // (SHARED_TT_ENTRY_BYTES * self.bucket_size), 1)
+            slot_count = self.bucket_count * self.bucket_size
+            self.memory = shared_memory.SharedMemory(
+                create=True, size=(SHARED_TT_HEADER_WORDS + slot_count * SHARED_TT_ENTRY_WORDS) * 8)
+            self.owner_pid = os.getpid()
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+            self.owner_pid = None
+            slot_count = (self.memory.size // 8 - SHARED_TT_HEADER_WORDS) // SHARED_TT_ENTRY_WORDS
+            self.bucket_count = slot_count // self.bucket_size
+        self.slot_count = self.bucket_count * self.bucket_size
+        self.words = self.memory.buf.cast('Q')
+        # Freed when the table is collected or at exit, if close was not called.
+        self._finalizer = weakref.finalize(self, _release_shared_memory, self.memory, self.words, self.owner_pid)
+        if name is None:
+            self.clear()
+            self.words[0] = 0
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.overwrites = 0
+
+    @property
+    def age(self):
+        return self.words[0]
+
+    def new_search(self):
+        """Marks the entries stored so far as old, so the depth-preferred slots may be replaced.
+        Only the process that created the table does this, so a search process starting to search a root
+        move does not age the entries of the others.
+        """
+        if os.getpid() == self.owner_pid:
+            self.words[0] = (self.words[0] + 1) % SHARED_TT_AGE_MODULO
+
+    def clear(self):
+        self.memory.buf[SHARED_TT_HEADER_WORDS * 8:] = bytes(self.slot_count * SHARED_TT_ENTRY_BYTES)
+
+    def _read(self, i):
+        """Reads slot i.
+        :return: A tuple: (The key stored in the slot or None if the slot is empty, The value bits, The data word)
+        """
+        words = self.words
+        w = SHARED_TT_HEADER_WORDS + i * SHARED_TT_ENTRY_WORDS
+        check, value_bits, data = words[w], words[w + 1], words[w + 2]
+        if not data:
+            return None, 0, 0
+        return check ^ value_bits ^ data, value_bits, data
+
+    def probe(self, key):
+        """Looks up a state.
+
+        :param key: The Zobrist key of the state.
+        :return: The entry stored for the key, as a tuple: (key, depth, value, bound type, best move, search age),
+        or None.
+        """
+        first = (key % self.bucket_count) * self.bucket_size
+        collided = False
+        for i in range(first, first + self.bucket_size):
+            entry_key, value_bits, data = self._read(i)
+            if entry_key is not None:
+                if entry_key == key:
+                    self.hits += 1
+                    return (key, (data & 0xff) - SHARED_TT_DEPTH_OFFSET, _DOUBLE.unpack(_WORD.pack(value_bits))[0],
+                            (data >> 8) & 3, unpack_move(data >> 18), (data >> 10) & 0xff)
+                collided = True
+        self.misses += 1
+        if collided:
+            self.collisions += 1
+        return None
+
+    def store(self, key, depth, value, bound, best_move):
+        """Stores a search result, replacing an existing entry according to the replacement scheme.
+
+        :param key: The Zobrist key of the state.
+        :param depth: The depth the state was searched to.
+        :param value: The search value.
+        :param bound: EXACT, LOWER_BOUND or UPPER_BOUND.
+        :param best_move: The best move found in the state, or None.
+        """
+        first = (key % self.bucket_count) * self.bucket_size
+        age = self.age
+        i = first
+        if self.replacement != ALWAYS_REPLACE:
+            entry_key, _, data = self._read(first)
+            if (entry_key is not None and entry_key != key and (data >> 10) & 0xff == age
+                    and (data & 0xff) - SHARED_TT_DEPTH_OFFSET > depth):
+                # The depth-preferred slot holds a deeper result from this search.
+                if self.replacement == DEPTH_PREFERRED:
+                    return
+                i = first + 1
+        entry_key, _, _ = self._read(i)
+        if entry_key is not None and entry_key != key:
+            self.overwrites += 1
+        depth = min(max(depth + SHARED_TT_DEPTH_OFFSET, 0), 0xff)
+        value_bits = _WORD.unpack(_DOUBLE.pack(value))[0]
+        data = depth | (bound << 8) | (age << 10) | (pack_move(best_move) << 18)
+        w = SHARED_TT_HEADER_WORDS + i * SHARED_TT_ENTRY_WORDS
+        words = self.words
+        words[w] = key ^ value_bits ^ data
+        words[w + 1] = value_bits
+        words[w + 2] = data
+
+    def stats(self):
+        """:return: A dict of the table's counters."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'collisions': self.collisions,
+            'overwrites': self.overwrites,
+            'slots': self.slot_count,
+            'used': sum(1 for i in range(self.slot_count) if self._read(i)[0] is not None),
+        }
+
+    def close(self):
+        """Detaches from the shared memory, and frees it if this process created the table."""
+        self._finalizer()
+
+    def __getstate__(self):
+        # Other processes attach to the same shared memory by its name.
+        return {'replacement': self.replacement, 'name': self.memory.name}
+
+    def __setstate__(self, state):
+        self.__init__(replacement=state['replacement'], name=state['name'])
+
+
+# Move ordering tiers, searched from the highest down. Moves in the same tier are sorted by their
+# history score, and keep their generation order when those are equal.
+MULTI_JUMP_TIER = 2
+KILLER_MOVE_TIER = 1
+QUIET_MOVE_TIER = 0
+
+KILLERS_PER_PLY = 2
+
+
+class MoveOrdering:
+
+    def __init__(self):
+        """Orders the moves of every node so alpha-beta cutoffs come early: iter_moves yields the hash move (the
+        best move of the previous iteration at the root, or the transposition table's best move below it) first,
+        and sorts the rest: multi-jump captures by the number of tools they jump, then the killer moves of the
+        ply, then the rest by the history heuristic.
+        A MiniMaxWithAlphaBetaPruning can be given any object with the same iter_moves, record_cutoff
+        and new_search methods.
+        """
+        self.pv_move = None
+        self.killers = []
+        self.history = {}
+
+    def new_search(self):
+        """Called at the start of every search. Halves the history scores, so recent cutoffs weigh more."""
+        for from_to in self.history:
+            self.history[from_to] /= 2
+
+    def iter_moves(self, state, ply, hash_move):
+        """Yields the moves of a node in the order they should be searched. The hash move is yielded before
+        the other moves are generated, so a cutoff on it saves generating them.
+
+        :param state: The state of the node. It may be changed between steps as long as it is restored.
+        :param ply: The distance of the state from the root.
+        :param hash_move: The best move known for this state, or None.
+        """
+        if ply == 0 and self.pv_move is not None and state.is_legal_move(self.pv_move):
+            hash_move = self.pv_move
+        elif hash_move is not None and not state.is_legal_move(hash_move):
+            hash_move = None
+        if hash_move is not None:
+            yield hash_move
+
+        moves = state.get_possible_moves()
+        if hash_move is not None:
+            moves = [move for move in moves if move != hash_move]
+        for move in self.order_moves(moves, ply):
+            yield move
+
+    def order_moves(self, moves, ply):
+        """Sorts the moves of a node.
+
+        :param moves: The possible moves of the state.
+        :param ply: The distance of the state from the root.
+        :return: The moves in the order they should be searched.
+        """
+        if len(moves) < 2:
+            return moves
+        killers = self.killers[ply] if ply < len(self.killers) else ()
+        history = self.history
+
+        def order_key(move):
+            from_to = (move.origin_loc, move.target_loc)
+            if len(move.jumped_locs) > 1:
+                return MULTI_JUMP_TIER, len(move.jumped_locs)
+            if from_to in killers:
+                return KILLER_MOVE_TIER, history.get(from_to, 0)
+            return QUIET_MOVE_TIER, history.get(from_to, 0)
+
+        return sorted(moves, key=order_key, reverse=True)
+
+    def record_cutoff(self, move, ply, depth):
+        """Called when a move caused a beta cutoff.
+
+        :param move: The move.
+        :param ply: The distance of the node from the root.
+        :param depth: The remaining search depth of the node.
+        """
+        if move.jumped_locs:
+            # Captures are forced and ordered by themselves.
+            return
+
+        from_to = (move.origin_loc, move.target_loc)
+        self.history[from_to] = self.history.get(from_to, 0) + depth * depth
+        while len(self.killers) <= ply:
+            self.killers.append([])
+        killers = self.killers[ply]
+        if from_to not in killers:
+            killers.insert(0, from_to)
+            del killers[KILLERS_PER_PLY:]
+
+
 class MiniMaxWithAlphaBetaPruning:
 
-    def __init__(self, utility, my_color, no_more_time, selective_deepening):
+    def __init__(self, utility, my_color, no_more_time, selective_deepening, transposition_table=None,
+                 move_ordering=None, tablebase=None):
         """Initialize a MiniMax algorithms with alpha-beta pruning.
 
         :param utility: The utility function. Should have state as parameter.
@@ -74,50 +622,640 @@ class MiniMaxWithAlphaBetaPruning:
         :param selective_deepening: A functions that gets the current state, and
                         returns True when the algorithm should continue the search
                         for the minimax value recursivly from this state.
+        :param transposition_table: An optional TranspositionTable, or SharedTranspositionTable. Keep the same
+                        instance (and the same utility and color) across searches to reuse their results.
+        :param move_ordering: An optional MoveOrdering. Without it the moves are searched in the order
+                        get_possible_moves returns them.
+        :param tablebase: An optional checkers.tablebase.EndgameTablebase. Leaves in it get their exact
+                        result instead of the utility, and a root in it is not searched at all.
         """
         self.utility = utility
         self.my_color = my_color
         self.no_more_time = no_more_time
         self.selective_deepening = selective_deepening
+        self.transposition_table = transposition_table
+        self.move_ordering = move_ordering
+        self.tablebase = tablebase
+        # Whether the last search found its root in the tablebase.
+        self.tablebase_hit = False
+
+        # Cooperative cancellation: set stop_requested (from any thread) to stop the running search, and
+        # clear it before the next one. stopped tells whether the last search was cut short, by the flag
+        # or by no_more_time.
+        self.stop_requested = False
+        self.stopped = False
+        # Deterministic limits (see SearchLimit): the search also stops after node_limit nodes, if it is set, and
+        # does not check no_more_time unless timed, so where it stops does not depend on the speed of the machine.
+        self.node_limit = None
+        self.timed = True
+
+        # The counters of the last search, see last_search_stats.
+        self.nodes = 0
+        self.leaves = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.search_start = None
+        self.cache_counters_start = None
 
     def search(self, state, depth, alpha, beta, maximizing_player):
         """Start the MiniMax algorithm.
 
-        :param state: The state to start from.
+        :param state: The state to start from. Moves are performed and unmade on it in place, so it is
+                      back in its original position when the search returns.
         :param depth: The maximum allowed depth for the algorithm.
         :param alpha: The alpha of the alpha-beta pruning.
         :param alpha: The beta of the alpha-beta pruning.
         :param maximizing_player: Whether this is a max node (True) or a min node (False).
         :return: A tuple: (The alpha-beta algorithm value, The move in case of max node or None in min mode)
+                 If the search was stopped (see self.stopped), these are the best of the root moves it
+                 finished searching, or None for the move if it finished none.
         """
-        if self.no_more_time() or (depth <= 0 and not self.selective_deepening(state)):
+        self._start_search()
+        root = self._probe_root(state, maximizing_player)
+        if root is not None:
+            return root
+        value, move = self._search(state, depth, alpha, beta, maximizing_player, 0)
+        self._finish_search(move)
+        return value, move
+
+    def _start_search(self):
+        self.stopped = self.stop_requested
+        self.nodes = 0
+        self.leaves = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.search_start = time.perf_counter()
+        self.cache_counters_start = self._cache_counters()
+        self.tablebase_hit = False
+        if self.transposition_table is not None:
+            self.transposition_table.new_search()
+        if self.move_ordering is not None:
+            self.move_ordering.new_search()
+
+    def _finish_search(self, move):
+        if self.move_ordering is not None and move is not None and not self.stopped:
+            # The next, deeper, iteration starts from this iteration's best move.
+            self.move_ordering.pv_move = move
+
+    def should_stop(self):
+        """:return: Whether the running search should stop: it was asked to, or it is out of nodes or time."""
+        return (self.stop_requested
+                or self.node_limit is not None and self.nodes >= self.node_limit
+                or self.timed and self.no_more_time())
+
+    def _cache_counters(self):
+        """:return: A tuple: (transposition table hits, its probes, tablebase hits, its probes)"""
+        tt, tablebase = self.transposition_table, self.tablebase
+        return (tt.hits if tt is not None else 0, tt.hits + tt.misses if tt is not None else 0,
+                tablebase.hits if tablebase is not None else 0, tablebase.probes if tablebase is not None else 0)
+
+    def last_search_stats(self, depth):
+        """The statistics of the last search, or of the running one so far.
+        :param depth: The depth it was searched to.
+        :return: A SearchStats.
+        """
+        stats = SearchStats(depth)
+        stats.nodes = self.nodes
+        stats.leaves = self.leaves
+        stats.cutoffs = self.cutoffs
+        stats.first_move_cutoffs = self.first_move_cutoffs
+        stats.time = time.perf_counter() - self.search_start
+        stats.completed = not self.stopped
+        stats.tablebase_root = self.tablebase_hit
+        (stats.tt_hits, stats.tt_probes, stats.tablebase_hits, stats.tablebase_probes) = (
+            now - start for now, start in zip(self._cache_counters(), self.cache_counters_start))
+        return stats
+
+    def _tablebase_value(self, state, result):
+        """:return: The value of a tablebase result of the player to move in state."""
+        if result == DRAW:
+            return 0
+        return INFINITY if (result == WIN) == (state.curr_player == self.my_color) else -INFINITY
+
+    def _probe_root(self, state, maximizing_player):
+        """Looks the root up in the tablebase.
+        :return: A tuple: (The value, The move the tablebase picks), or None if the root is not in it.
+        """
+        if self.tablebase is None or not maximizing_player:
+            return None
+        found = self.tablebase.best_move(state)
+        if found is None or found[1] is None:
+            return None
+        self.tablebase_hit = True
+        return self._tablebase_value(state, found[0]), found[1]
+
+    def _search(self, state, depth, alpha, beta, maximizing_player, ply):
+        """The recursive part of search. ply is the distance from the root state."""
+        self.nodes += 1
+        if not self.nodes % STOP_CHECK_INTERVAL and self.should_stop():
+            self.stopped = True
+        if self.stopped:
+            # The caller throws this value away.
+            return 0, None
+        if depth <= 0 and not self.selective_deepening(state):
+            self.leaves += 1
+            if self.tablebase is not None:
+                probe = self.tablebase.probe_state(state)
+                if probe is not None:
+                    return self._tablebase_value(state, probe[0]), None
             return self.utility(state), None
 
-        next_moves = state.get_possible_moves()
-        if not next_moves:
-            # This player has no moves. So the previous player is the winner.
-            return INFINITY if state.curr_player != self.my_color else -INFINITY, None
+        tt = self.transposition_table
+        hash_move = None
+        if tt is not None:
+            # The values depend on the plies since the last jump, so the same position with another count is
+            # another entry.
+            tt_key = plies_zobrist_key(state.zobrist_key, state.turns_since_last_jump)
+            entry = tt.probe(tt_key)
+            if entry is not None:
+                _, entry_depth, value, bound, hash_move, _ = entry
+                if ply > 0 and entry_depth >= depth and (
+                        bound == EXACT
+                        or (bound == LOWER_BOUND and value >= beta)
+                        or (bound == UPPER_BOUND and value <= alpha)):
+                    return value, hash_move if maximizing_player else None
+
+        # The moves are generated lazily, so a cutoff on an early move saves generating the others.
+        ordering = self.move_ordering
+        if ordering is not None:
+            next_moves = ordering.iter_moves(state, ply, hash_move)
+        else:
+            next_moves = state.iter_moves(hash_move)
 
+        # A child cut short by a stop is not counted, so a stopped node returns the best of the moves it
+        # finished searching.
+        alpha_orig, beta_orig = alpha, beta
+        timed_out = False
+        selected_move = None
         if maximizing_player:
-            selected_move = next_moves[0]
             best_move_utility = -INFINITY
-            for move in next_moves:
-                new_state = copy.deepcopy(state)
-                new_state.perform_move(move)
-                minimax_value, _ = self.search(new_state, depth - 1, alpha, beta, False)
+            for move_index, move in enumerate(next_moves):
+                undo_token = state.perform_move(move)
+                minimax_value, _ = self._search(state, depth - 1, alpha, beta, False, ply + 1)
+                state.unmake_move(move, undo_token)
+                if self.stopped:
+                    timed_out = True
+                    break
                 alpha = max(alpha, minimax_value)
-                if minimax_value > best_move_utility:
+                if selected_move is None or minimax_value > best_move_utility:
                     best_move_utility = minimax_value
                     selected_move = move
-                if beta <= alpha or self.no_more_time():
+                if beta <= alpha:
+                    self.cutoffs += 1
+                    if not move_index:
+                        self.first_move_cutoffs += 1
+                    if ordering is not None:
+                        ordering.record_cutoff(move, ply, depth)
                     break
-            return alpha, selected_move
+            value = alpha
 
         else:
-            for move in next_moves:
-                new_state = copy.deepcopy(state)
-                new_state.perform_move(move)
-                beta = min(beta, self.search(new_state, depth - 1, alpha, beta, True)[0])
-                if beta <= alpha or self.no_more_time():
+            best_move_utility = INFINITY
+            for move_index, move in enumerate(next_moves):
+                undo_token = state.perform_move(move)
+                minimax_value, _ = self._search(state, depth - 1, alpha, beta, True, ply + 1)
+                state.unmake_move(move, undo_token)
+                if self.stopped:
+                    timed_out = True
+                    break
+                beta = min(beta, minimax_value)
+                if selected_move is None or minimax_value < best_move_utility:
+                    best_move_utility = minimax_value
+                    selected_move = move
+                if beta <= alpha:
+                    self.cutoffs += 1
+                    if not move_index:
+                        self.first_move_cutoffs += 1
+                    if ordering is not None:
+                        ordering.record_cutoff(move, ply, depth)
                     break
-            return beta, None
+            value = beta
+
+        if timed_out:
+            # A search cut short did not look at all the moves, so its value is not stored.
+            return value, selected_move if maximizing_player else None
+
+        if selected_move is None:
+            # This player has no moves. So the previous player is the winner.
+            return INFINITY if state.curr_player != self.my_color else -INFINITY, None
+
+        if tt is not None:
+            if value <= alpha_orig:
+                bound = UPPER_BOUND
+            elif value >= beta_orig:
+                bound = LOWER_BOUND
+            else:
+                bound = EXACT
+            tt.store(tt_key, depth, value, bound, selected_move)
+
+        return value, selected_move if maximizing_player else None
+
+
+def process_context():
+    """The players start their pools while the runner times them from another thread, and a process forked from a
+    process with threads running may deadlock on a lock one of them held. So pools are started by a fork server,
+    which has no threads, or spawned where there is none (on Windows).
+    :return: A multiprocessing context to start the processes of a player with.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+# The searcher of a search process of a ParallelMiniMaxWithAlphaBetaPruning pool, with the shared alpha.
+_process_searcher = None
+_process_alpha = None
+
+# How often (in seconds) a parallel search checks for a stop while it waits for its search processes.
+PARALLEL_POLL_INTERVAL = 0.005
+
+
+def _init_search_process(utility, my_color, selective_deepening, shared_alpha, shared_stop, transposition_table,
+                         tablebase):
+    """Initializes a search process: its own searcher and move ordering, kept for all the root moves it
+    searches, and a transposition table: its own, or a SharedTranspositionTable shared with the others.
+    It stops when the parent sets shared_stop.
+    """
+    global _process_searcher, _process_alpha
+    _process_searcher = MiniMaxWithAlphaBetaPruning(utility, my_color, lambda: shared_stop.value, selective_deepening,
+                                                    transposition_table, MoveOrdering(), tablebase)
+    _process_alpha = shared_alpha
+
+
+def _search_root_move(state, move, depth, beta):
+    """Searches one root move in a search process, with the best alpha any process has found so far.
+    :return: A tuple: (The value, The alpha it was searched with, Whether the search was stopped,
+    The nodes, leaves, cutoffs and first move cutoffs of the search)
+    """
+    if _process_searcher.no_more_time():
+        # The parallel search was stopped before this move was started.
+        return -INFINITY, -INFINITY, True, (0, 0, 0, 0)
+    state.perform_move(move)
+    alpha = _process_alpha.value
+    value, _ = _process_searcher.search(state, depth - 1, alpha, beta, False)
+    if not _process_searcher.stopped and value > alpha:
+        # Publishing the better alpha, so root moves searched later can prune more.
+        with _process_alpha.get_lock():
+            if value > _process_alpha.value:
+                _process_alpha.value = value
+    return value, alpha, _process_searcher.stopped, (_process_searcher.nodes, _process_searcher.leaves,
+                                                     _process_searcher.cutoffs, _process_searcher.first_move_cutoffs)
+
+
+class ParallelMiniMaxWithAlphaBetaPruning(MiniMaxWithAlphaBetaPruning):
+
+    def __init__(self, utility, my_color, no_more_time, selective_deepening, transposition_table=None,
+                 move_ordering=None, processes=None, process_tt_memory_bytes=DEFAULT_TT_MEMORY_BYTES,
+                 tablebase=None):
+        """A MiniMax with alpha-beta pruning that splits the root moves across a pool of processes.
+        The first root move (the best one of the previous iteration, with move ordering) is searched here, to
+        get a good alpha, and the rest are searched by the pool. The processes share the best alpha found so
+        far, so a root move started later prunes with it. A stop (see should_stop) is passed on to the processes,
+        and search returns the best of the root moves they finished. The node limit is checked against the nodes
+        of the root moves the processes finished, and the processes race, so its searches are not deterministic.
+        Searches of depth 1, min-node roots and searches with a single root move are run here serially.
+
+        :param processes: The number of search processes. Defaults to the number of CPUs.
+        :param process_tt_memory_bytes: The memory budget of the transposition table of each process, when
+        they do not share one.
+        The other parameters are as in MiniMaxWithAlphaBetaPruning. utility and selective_deepening are sent
+        to the processes, so they must be picklable. When transposition_table is a SharedTranspositionTable,
+        this process and the search processes all use it, instead of a table per process.
+        """
+        MiniMaxWithAlphaBetaPruning.__init__(self, utility, my_color, no_more_time, selective_deepening,
+                                             transposition_table, move_ordering, tablebase)
+        self.processes = processes or multiprocessing.cpu_count()
+        context = process_context()
+        self.shared_alpha = context.Value('d', -INFINITY)
+        self.shared_stop = context.Value('b', False, lock=False)
+        if isinstance(transposition_table, SharedTranspositionTable):
+            process_transposition_table = transposition_table
+        else:
+            process_transposition_table = TranspositionTable(process_tt_memory_bytes)
+        self.pool = context.Pool(self.processes, _init_search_process,
+                                 (utility, my_color, selective_deepening, self.shared_alpha,
+                                  self.shared_stop, process_transposition_table, tablebase))
+
+    def search(self, state, depth, alpha, beta, maximizing_player):
+        """Start the MiniMax algorithm, splitting the root moves across the search processes.
+        See MiniMaxWithAlphaBetaPruning.search.
+        """
+        if depth < 2 or not maximizing_player:
+            return MiniMaxWithAlphaBetaPruning.search(self, state, depth, alpha, beta, maximizing_player)
+
+        self._start_search()
+        root = self._probe_root(state, maximizing_player)
+        if root is not None:
+            return root
+        if self.move_ordering is not None:
+            next_moves = list(self.move_ordering.iter_moves(state, 0, None))
+        else:
+            next_moves = state.get_possible_moves()
+        if len(next_moves) < 2:
+            self.stopped = self.stop_requested
+            return MiniMaxWithAlphaBetaPruning.search(self, state, depth, alpha, beta, maximizing_player)
+
+        # The first move is searched here, for a good alpha to start the processes with.
+        selected_move = next_moves[0]
+        undo_token = state.perform_move(selected_move)
+        best_move_utility, _ = self._search(state, depth - 1, alpha, beta, False, 1)
+        state.unmake_move(selected_move, undo_token)
+        if self.stopped:
+            return alpha, None
+        alpha = max(alpha, best_move_utility)
+
+        if alpha < beta:
+            self.shared_alpha.value = alpha
+            self.shared_stop.value = False
+            pending = [(move, self.pool.apply_async(_search_root_move, (state, move, depth, beta)))
+                       for move in next_moves[1:]]
+            while pending:
+                move, async_result = pending[0]
+                if not async_result.ready():
+                    async_result.wait(PARALLEL_POLL_INTERVAL)
+                    if not self.shared_stop.value and self.should_stop():
+                        self.shared_stop.value = True
+                    continue
+                pending.pop(0)
+                minimax_value, searched_alpha, stopped, counters = async_result.get()
+                nodes, leaves, cutoffs, first_move_cutoffs = counters
+                self.nodes += nodes
+                self.leaves += leaves
+                self.cutoffs += cutoffs
+                self.first_move_cutoffs += first_move_cutoffs
+                if stopped or self.shared_stop.value and minimax_value <= searched_alpha:
+                    self.stopped = self.stopped or stopped
+                    continue
+                # A value not above the alpha it was searched with is only a bound, and the move that
+                # raised alpha to it reports its own value.
+                if minimax_value > searched_alpha and minimax_value > best_move_utility:
+                    best_move_utility = minimax_value
+                    selected_move = move
+                    alpha = max(alpha, minimax_value)
+                if beta <= alpha and not self.shared_stop.value:
+                    # A cutoff at the root: the remaining moves need not be searched.
+                    self.shared_stop.value = True
+            self.stopped = self.stopped or self.stop_requested
+
+        self._finish_search(selected_move)
+        return alpha, selected_move
+
+    def close(self):
+        """Ends the search processes."""
+        self.pool.terminate()
+        self.pool.join()
+
+
+class SearchStats:
+
+    def __init__(self, depth):
+        """The statistics of one search: an iteration of iterative deepening.
+        The cache counters are of the search's own process (the search processes of a parallel search count
+        their own).
+        """
+        self.depth = depth
+        self.nodes = 0
+        self.leaves = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.tablebase_probes = 0
+        self.tablebase_hits = 0
+        # Whether the root was in the tablebase, so it was not searched.
+        self.tablebase_root = False
+        # The wall clock time of the search, in seconds.
+        self.time = 0.0
+        # False if the search was stopped before it finished.
+        self.completed = False
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+def _rate(count, total):
+    return count / total if total else None
+
+
+class SearchResult:
+
+    def __init__(self):
+        """The result of an iterative deepening search.
+        depth, value and move are of the deepest completed iteration (depth is 0 if none completed).
+        partial_depth, partial_value and partial_move are of the iteration that was interrupted, if any: the
+        best of the root moves it finished searching (partial_move is None if it finished none of them).
+        out_of_memory tells whether the search was stopped by a MemoryError rather than by its limits.
+        """
+        self.depth = 0
+        self.value = None
+        self.move = None
+        self.partial_depth = None
+        self.partial_value = None
+        self.partial_move = None
+        self.out_of_memory = False
+        self.error = None
+        # The SearchStats of every iteration, the interrupted one included.
+        self.iterations = []
+
+    def stats_record(self):
+        """Sums the statistics of the iterations up, in a dict of plain values that can be written as JSON.
+        The effective branching factor is the ratio of the nodes of the last two completed iterations.
+        """
+        iterations = self.iterations
+        completed = [stats for stats in iterations if stats.completed]
+        nodes = sum(stats.nodes for stats in iterations)
+        search_time = sum(stats.time for stats in iterations)
+        cutoffs = sum(stats.cutoffs for stats in iterations)
+        return {
+            'depth': self.depth,
+            'partial_depth': self.partial_depth,
+            'value': self.value,
+            'nodes': nodes,
+            'leaves': sum(stats.leaves for stats in iterations),
+            'time': search_time,
+            'nps': _rate(nodes, search_time),
+            'ebf': _rate(completed[-1].nodes, completed[-2].nodes) if len(completed) > 1 else None,
+            'cutoffs': cutoffs,
+            'first_move_cutoff_rate': _rate(sum(stats.first_move_cutoffs for stats in iterations), cutoffs),
+            'tt_hit_rate': _rate(sum(stats.tt_hits for stats in iterations),
+                                 sum(stats.tt_probes for stats in iterations)),
+            'tablebase_hit_rate': _rate(sum(stats.tablebase_hits for stats in iterations),
+                                        sum(stats.tablebase_probes for stats in iterations)),
+            'tablebase_root': any(stats.tablebase_root for stats in iterations),
+            'out_of_memory': self.out_of_memory,
+            'iterations': [stats.to_dict() for stats in iterations],
+        }
+
+    def best_move(self):
+        """:return: The move to play: the interrupted iteration's best if it has one (its first root move is
+                 the completed iteration's best, searched deeper), otherwise the completed iteration's.
+        """
+        if self.partial_move is not None:
+            return self.partial_move
+        return self.move
+
+
+# The environment variable naming a JSONL file for the players to append their search statistics to, instead of
+# printing them.
+SEARCH_STATS_ENV = 'CHECKERS_SEARCH_STATS'
+
+
+class JsonlStatsSink:
+
+    def __init__(self, file_name):
+        """A stats sink appending every record as a line of JSON to a file. The file is opened per record, so
+        the players of many processes can share it.
+        """
+        self.file_name = file_name
+
+    def __call__(self, record):
+        line = json.dumps(record) + '\n'
+        with open(self.file_name, 'a') as f:
+            f.write(line)
+
+
+def print_stats(record):
+    """A stats sink printing the main figures of every record."""
+    if record.get('book'):
+        print('book move: {}'.format(record['move']))
+        return
+    if 'playouts' in record:
+        print('playouts: {}, playouts/s: {:.0f}, tree size: {} ({} reused), value: {:.2f}, best_move: {}'.format(
+            record['playouts'], record['playouts_per_second'] or 0, record['tree_size'], record['reused_nodes'],
+            record['value'], record['move']))
+        return
+    print('achieved depth: {}, interrupted depth: {}, alpha: {}, best_move: {}'.format(
+        record['depth'], record['partial_depth'], record['value'], record['move']))
+    if record['out_of_memory']:
+        print('the search ran out of memory')
+    if record['value'] == INFINITY:
+        print('the move: {} will guarantee victory.'.format(record['move']))
+    elif record['value'] == -INFINITY:
+        print('all is lost')
+    if record['first_move_cutoff_rate'] is not None:
+        print('nodes: {}, first move cutoff rate: {:.2f} of {} cutoffs'.format(
+            record['nodes'], record['first_move_cutoff_rate'], record['cutoffs']))
+
+
+def default_stats_sink():
+    """:return: A JsonlStatsSink of the file named by SEARCH_STATS_ENV if it is set, otherwise print_stats."""
+    file_name = os.environ.get(SEARCH_STATS_ENV)
+    return JsonlStatsSink(file_name) if file_name else print_stats
+
+
+class SearchLimit:
+
+    def __init__(self, depth=None, nodes=None, seed=0):
+        """A limit on the searches of a player that replaces its time limit: every search stops at a fixed depth,
+        or after a fixed number of nodes over all its iterations, whichever comes first. Where a search stops
+        does not depend on the speed or the load of the machine, so a game between players with the same limit
+        can be replayed move for move (unless a player searches in parallel processes).
+
+        :param depth: The deepest iteration, or None for no limit.
+        :param nodes: The number of nodes, or None for no limit.
+        :param seed: The seed of the random choices of the players, e.g. between opening book moves.
+        """
+        if depth is None and nodes is None:
+            raise ValueError('A search limit needs a depth or a number of nodes')
+        self.depth = depth
+        self.nodes = nodes
+        self.seed = seed
+
+    @classmethod
+    def parse(cls, text):
+        """Parses a search limit such as 'depth=6', 'nodes=20000' or 'depth=8,nodes=50000,seed=1'.
+        :return: A SearchLimit.
+        :raises ValueError: If the text is not a search limit.
+        """
+        fields = {}
+        for field in text.split(','):
+            name, _, value = field.partition('=')
+            if name not in ('depth', 'nodes', 'seed') or name in fields:
+                raise ValueError('Bad search limit: {}'.format(text))
+            fields[name] = int(value)
+        return cls(**fields)
+
+    def __repr__(self):
+        return ','.join('{}={}'.format(name, value) for name, value in
+                        (('depth', self.depth), ('nodes', self.nodes), ('seed', self.seed)) if value is not None)
+
+
+class SearchWorker:
+
+    def __init__(self, minimax):
+        """A long-lived thread running the iterative deepening searches of one player, replacing a new thread
+        per depth. A search is stopped cooperatively through the minimax stop flag, and iterative_deepening
+        returns only after the search has stopped, so no search keeps running after a move is chosen.
+
+        :param minimax: The MiniMaxWithAlphaBetaPruning to search with.
+        """
+        self.minimax = minimax
+        self.jobs = Queue()
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            state, max_depth, max_nodes, result, done = job
+            try:
+                self._iterative_deepening(state, max_depth, max_nodes, result)
+            except MemoryError:
+                result.out_of_memory = True
+            except Exception as e:
+                result.error = e
+            finally:
+                done.set()
+
+    def _iterative_deepening(self, state, max_depth, max_nodes, result):
+        minimax = self.minimax
+        depth = 1
+        nodes = 0
+        while max_depth is None or depth <= max_depth:
+            if minimax.stop_requested:
+                break
+            # The node limit is over all the iterations.
+            minimax.node_limit = max_nodes - nodes if max_nodes is not None else None
+            value, move = minimax.search(state, depth, -INFINITY, INFINITY, True)
+            result.iterations.append(minimax.last_search_stats(depth))
+            nodes += minimax.nodes
+            if minimax.stopped:
+                result.partial_depth, result.partial_value, result.partial_move = depth, value, move
+                break
+            result.depth, result.value, result.move = depth, value, move
+            if value == INFINITY or value == -INFINITY or minimax.tablebase_hit:
+                # The game is decided (or its result is in the tablebase), searching deeper will not change it.
+                break
+            depth += 1
+
+    def iterative_deepening(self, state, time_limit, max_depth=None, max_nodes=None):
+        """Searches state with increasing depths on the worker thread, until the time limit, the minimax's
+        no_more_time, max_depth, max_nodes, or a decided game stops it.
+
+        :param state: The state to search. It is in its original position again when this returns.
+        :param time_limit: The time limit in seconds. None searches without a time limit, and without checking
+                           no_more_time, so the search is the same on every machine (see SearchLimit).
+        :param max_depth: The deepest iteration to run, or None for no limit.
+        :param max_nodes: The number of nodes to stop after, over all the iterations, or None for no limit.
+        :return: A SearchResult.
+        """
+        result = SearchResult()
+        done = Event()
+        self.minimax.stop_requested = False
+        self.minimax.timed = time_limit is not None
+        self.jobs.put((state, max_depth, max_nodes, result, done))
+        if time_limit is None:
+            done.wait()
+        elif not done.wait(max(time_limit, 0)):
+            self.minimax.stop_requested = True
+            # The search checks the flag every STOP_CHECK_INTERVAL nodes, so this wait is short.
+            done.wait()
+        if result.error is not None:
+            raise result.error
+        return result
+
+    def close(self):
+        """Ends the worker thread once it finishes its current search."""
+        self.jobs.put(None)